@@ -0,0 +1,46 @@
+"""
+Username / email availability checks shared by UserUpdateForm and the
+dashboard's live availability endpoint.
+
+Both are single EXISTS lookups on an index (auth_user.username is unique;
+migration 0017 indexes auth_user.email), so a check costs the same however
+many accounts there are. The endpoint is rate-limited per user with a
+fixed-window counter in the shared cache.
+
+The limit is only as atomic as the cache's incr(). Memcached, Redis and the
+database cache increment atomically, so the limit is exact. The default
+FileBasedCache (and LocMemCache across processes) reads and then rewrites
+the value, so concurrent checks can lose increments and a user can get a
+little past the limit. That is acceptable for a UX throttle. It is not a
+security control; use an atomic backend if it has to hold exactly.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+
+def username_taken(username, exclude_pk=None):
+    return User.objects.filter(username=username).exclude(pk=exclude_pk).exists()
+
+
+def email_taken(email, exclude_pk=None):
+    return User.objects.filter(email=email).exclude(pk=exclude_pk).exists()
+
+
+def allow_availability_check(user):
+    """
+    Counts a check against ``user``'s AVAILABILITY_CHECKS_PER_MINUTE; False
+    once the current one-minute window is used up (approximately, on caches
+    without an atomic incr(); see the module docstring).
+    """
+    window = int(time.time() // 60)
+    key = f'blog:availability:{user.pk}:{window}'
+    cache.add(key, 0, 60)
+    try:
+        checks = cache.incr(key)
+    except ValueError:  # expired between add() and incr()
+        cache.set(key, 1, 60)
+        checks = 1
+    return checks <= settings.AVAILABILITY_CHECKS_PER_MINUTE
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html # <-- Import this
 from .models import Post, Comment, Notification, Genre ,SiteSettings
+from .moderation import approve_comments, delete_comments, reject_comments
 
 
 @admin.register(Genre)
@@ -20,12 +21,12 @@ class PostAdmin(admin.ModelAdmin):
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     # Use the new display_status function in the list display
-    list_display = ('post', 'author', 'created_at', 'display_status', 'toxicity_label')
-    list_filter = ('status', 'created_at', 'post')
+    list_display = ('post', 'author', 'created_at', 'display_status', 'toxicity_label', 'model_version')
+    list_filter = ('status', 'model_version', 'created_at', 'post')
     search_fields = ('text', 'author__username', 'post__title')
     
     # Define the actions
-    actions = ['approve_comments', 'delete_reported_comments']
+    actions = ['approve_comments', 'reject_comments', 'delete_reported_comments']
 
     # 1. NEW FUNCTION to add color to the status column
     def display_status(self, obj):
@@ -35,6 +36,8 @@ class CommentAdmin(admin.ModelAdmin):
             color = 'orange'
         elif obj.status == 'reported':
             color = 'red'
+        elif obj.status == 'pending_classification':
+            color = 'gray'
         else:
             color = 'black'
         # get_status_display() shows the user-friendly name (e.g., "Pending Review")
@@ -45,14 +48,18 @@ class CommentAdmin(admin.ModelAdmin):
 
     # 2. RENAMED ACTION for clarity
     def approve_comments(self, request, queryset):
-        # Update the status to 'approved'
-        queryset.update(status='approved')
+        # One UPDATE plus one bulk_create of "approved" notifications
+        approve_comments(queryset)
     approve_comments.short_description = "Mark selected comments as Approved"
 
+    def reject_comments(self, request, queryset):
+        reject_comments(queryset)
+    reject_comments.short_description = "Mark selected comments as Rejected"
+
     # 3. IMPROVED ACTION to delete instead of just marking as rejected
     def delete_reported_comments(self, request, queryset):
-        # This is more decisive for bad comments
-        queryset.delete()
+        # This is more decisive for bad comments (replies go too)
+        delete_comments(queryset)
     delete_reported_comments.short_description = "Delete selected comments"
 
 # =============================================================================
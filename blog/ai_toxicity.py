@@ -1,21 +1,118 @@
+import hashlib
+import logging
 import pickle
+import threading
+import time
 import numpy as np
-import re
-from collections import Counter
+from collections import OrderedDict
 from django.conf import settings
 import os
 
+from .classifier_metrics import classifier_metrics
+from .model_artifacts import current_version, is_artifact_dir, is_model_root, load_artifacts
+from .profiling import record as record_timing
+from .text_processing import Tokenizer, stem
+
+logger = logging.getLogger(__name__)
+# Model load, warm-up and reload timings, logged at INFO (see settings.LOGGING).
+timing_logger = logging.getLogger('blog.classifier')
+
+# Versioned model root (see model_artifacts.publish_artifacts).
+MODEL_ROOT = getattr(settings, 'TOXICITY_MODEL_ROOT', os.path.join(os.path.dirname(__file__), 'toxicity_models'))
+LEGACY_MODEL_PATH = os.path.join(os.path.dirname(__file__), 'naive_bayes_model.pkl')
+
+class VerdictCache:
+    """
+    Bounded, thread-safe LRU cache of (is_toxic, label) verdicts.
+
+    Keys are digests of the model version and the normalized token sequence,
+    so copy-pasted comments that only differ in case, punctuation or stop
+    words share one entry, and a verdict is never served for another model.
+    A maxsize of 0 stores nothing.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key_for(tokens, version=None):
+        key = '\x00'.join([version or '', *tokens])
+        return hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+
+    def get(self, key):
+        with self._lock:
+            verdict = self._entries.get(key)
+            if verdict is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return verdict
+
+    def put(self, key, verdict):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = verdict
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
 class ToxicityClassifier:
-    def __init__(self, model_path=None):
+    # THIS IS YOUR NEW TUNING KNOB!
+    # 0.70 means we only flag if we are >70% sure it's toxic.
+    TOXICITY_THRESHOLD = 0.70
+
+    def __init__(self, model_path=None, cache_size=None):
         if model_path is None:
-            model_path = os.path.join(os.path.dirname(__file__), 'naive_bayes_model.pkl')
+            # Prefer the versioned, memory-mapped models; the pickle is only a fallback.
+            model_path = MODEL_ROOT if is_model_root(MODEL_ROOT) else LEGACY_MODEL_PATH
         
         self.NON_TOXIC_LABEL = 'non-toxic'
         self.model_loaded = False
+        self.model_path = model_path
+        self.version = None
+
+        # The cache belongs to this instance, so loading a new model (a new
+        # ToxicityClassifier) always starts from an empty cache.
+        if cache_size is None:
+            cache_size = getattr(settings, 'TOXICITY_CACHE_SIZE', 4096)
+        self.cache = VerdictCache(cache_size) if cache_size > 0 else None
+        self.metrics = classifier_metrics if getattr(settings, 'TOXICITY_METRICS_ENABLED', True) else None
+        started = time.perf_counter()
 
         try:
-            with open(model_path, 'rb') as f:
-                artifacts = pickle.load(f)
+            if is_model_root(model_path):
+                self.version, model_dir = current_version(model_path)
+                artifacts = load_artifacts(model_dir)
+            elif is_artifact_dir(model_path):
+                self.version = os.path.basename(os.path.normpath(model_path))
+                artifacts = load_artifacts(model_path)
+            else:
+                with open(model_path, 'rb') as f:
+                    artifacts = pickle.load(f)
+                self.version = 'legacy-pickle'
             
             self.priors = artifacts['priors']
             self.likelihoods = artifacts['likelihoods']
@@ -24,72 +121,260 @@ class ToxicityClassifier:
             self.alpha = artifacts['alpha']
             self.total_words_per_class = artifacts['total_words_per_class']
             self.stop_words = artifacts['stop_words']
+            self.tokenizer = Tokenizer(self.stop_words, max_stems=len(self.word2idx))
+
+            # Stack the per-class likelihoods into one (classes x vocab+1) matrix.
+            # The extra last column holds each class's out-of-vocabulary penalty,
+            # so unknown words are scored by the same gather as known ones.
+            self.prior_vector = np.array([self.priors[c] for c in self.classes], dtype=np.float64)
+            self.oov_penalty = np.log(self.alpha / np.array([self.total_words_per_class[c] for c in self.classes], dtype=np.float64))
+            self.oov_index = len(self.word2idx)
+            if 'likelihood_matrix' in artifacts:
+                # Already stacked on disk; keep the read-only memmap shared.
+                self.likelihood_matrix = artifacts['likelihood_matrix']
+            else:
+                self.likelihood_matrix = np.hstack([
+                    np.vstack([self.likelihoods[c] for c in self.classes]),
+                    self.oov_penalty[:, None],
+                ])
+            self.toxic_mask = np.array([c != self.NON_TOXIC_LABEL for c in self.classes])
 
             self.model_loaded = True
-            print("Toxicity model loaded successfully.")
         except FileNotFoundError:
-            print(f"ERROR: Model file not found at {model_path}. Predictions will be disabled.")
+            logger.error("Model file not found at %s. Predictions will be disabled.", model_path)
         except Exception as e:
-            print(f"ERROR: An unexpected error occurred while loading the model: {e}")
+            logger.exception("An unexpected error occurred while loading the model: %s", e)
+
+        self.load_seconds = time.perf_counter() - started
 
     def stem(self, word):
-        suffixes = ['ing', 'ly', 'ed', 's', 'es']
-        for suffix in suffixes:
-            if word.endswith(suffix) and len(word) > len(suffix) + 2:
-                return word[:-len(suffix)]
-        return word
+        return stem(word)
 
     def preprocess(self, text):
-        text = str(text).lower()
-        text = re.sub(r'[^a-z\s]', '', text)
-        tokens = text.split()
-        return [self.stem(w) for w in tokens if w not in self.stop_words]
+        return self.tokenizer(text)
 
     def predict(self, text):
         if not self.model_loaded:
             return False, 'clean'
 
+        started = time.perf_counter()
         tokens = self.preprocess(text)
+
+        if self.cache is not None:
+            cache_key = VerdictCache.key_for(tokens, self.version)
+            verdict = self.cache.get(cache_key)
+            if verdict is not None:
+                elapsed = time.perf_counter() - started
+                if self.metrics is not None:
+                    self.metrics.record(elapsed, verdict[1], len(tokens))
+                record_timing('classifier', elapsed)
+                return verdict
         
         # --- START OF NEW, MORE INTELLIGENT LOGIC ---
 
-        # 1. Calculate the log scores for each class (same as before)
-        class_scores = {c: self.priors[c] for c in self.classes}
-        for word in tokens:
-            for c in self.classes:
-                if word in self.word2idx:
-                    class_scores[c] += self.likelihoods[c][self.word2idx[word]]
-                else:
-                    class_scores[c] += np.log(self.alpha / self.total_words_per_class[c])
+        # 1. Calculate the log scores for each class with one gather + sum.
+        # Unknown words map to the OOV column appended at load time.
+        indices = self._token_indices(tokens)
+        scores = self.prior_vector + self.likelihood_matrix[:, indices].sum(axis=1)
         
         # 2. Convert the raw log scores into probabilities (0 to 1)
-        # This is a simplified version of the "softmax" function
-        scores = np.array(list(class_scores.values()))
-        exp_scores = np.exp(scores - np.max(scores)) # Subtract max for numerical stability
-        probabilities = exp_scores / exp_scores.sum()
-        class_probabilities = {c: p for c, p in zip(self.classes, probabilities)}
+        probabilities = self._softmax(scores[None, :])
 
         # 3. Apply a threshold to make a final decision
-        # THIS IS YOUR NEW TUNING KNOB!
-        # 0.70 means we only flag if we are >70% sure it's toxic.
-        TOXICITY_THRESHOLD = 0.70 
-        
-        is_toxic = False
-        final_label = 'clean'
-        highest_toxic_prob = 0
-        
-        # Find the total probability of all toxic classes
-        total_toxic_prob = sum(prob for label, prob in class_probabilities.items() if label != self.NON_TOXIC_LABEL)
-
-        if total_toxic_prob > TOXICITY_THRESHOLD:
-            is_toxic = True
-            # Find which toxic class was the most likely
-            toxic_classes = {label: prob for label, prob in class_probabilities.items() if label != self.NON_TOXIC_LABEL}
-            final_label = max(toxic_classes, key=toxic_classes.get)
+        is_toxic, final_label = self._decide(probabilities)[0]
 
         # --- END OF NEW LOGIC ---
 
+        if self.cache is not None:
+            self.cache.put(cache_key, (is_toxic, final_label))
+        elapsed = time.perf_counter() - started
+        record_timing('classifier', elapsed)
+        if self.metrics is not None:
+            self.metrics.record(
+                elapsed, final_label, len(tokens),
+                oov_count=int((indices == self.oov_index).sum()),
+                margin=float(probabilities[0, self.toxic_mask].sum()) - self.TOXICITY_THRESHOLD,
+            )
         return is_toxic, final_label
 
-# Singleton Instance
-toxicity_classifier = ToxicityClassifier()
\ No newline at end of file
+    def predict_many(self, texts):
+        """
+        Classifies an iterable of texts in one vectorized pass.
+
+        Returns a tuple ``(verdicts, probabilities)`` where ``verdicts`` is a
+        list of ``(is_toxic, label)`` tuples, exactly as ``predict`` would
+        return them, and ``probabilities`` is an ``(n_texts, n_classes)``
+        array whose columns follow ``self.classes``.
+        """
+        texts = list(texts)
+        if not self.model_loaded:
+            return [(False, 'clean')] * len(texts), np.empty((len(texts), 0))
+        if not texts:
+            return [], np.empty((0, len(self.classes)))
+
+        started = time.perf_counter()
+        # 1. Tokenize everything into one flat index buffer plus offsets.
+        tokens = []
+        offsets = np.zeros(len(texts) + 1, dtype=np.intp)
+        for i, text in enumerate(texts):
+            tokens.extend(self.preprocess(text))
+            offsets[i + 1] = len(tokens)
+        flat = self._token_indices(tokens)
+
+        # 2. Gather every token's column once and sum each text's segment.
+        # A trailing zero column keeps reduceat valid for empty trailing texts.
+        gathered = np.take(self.likelihood_matrix, flat, axis=1)
+        gathered = np.hstack([gathered, np.zeros((len(self.classes), 1))])
+        sums = np.add.reduceat(gathered, offsets[:-1], axis=1)
+        sums[:, offsets[1:] == offsets[:-1]] = 0.0
+        scores = self.prior_vector + sums.T
+
+        # 3. Same softmax and threshold as predict, applied row-wise.
+        probabilities = self._softmax(scores)
+        verdicts = self._decide(probabilities)
+        record_timing('classifier', time.perf_counter() - started)
+        return verdicts, probabilities
+
+    def _token_indices(self, tokens):
+        """Maps tokens to likelihood_matrix columns; unknown words get the OOV column."""
+        if isinstance(self.word2idx, dict):
+            word2idx, oov = self.word2idx, self.oov_index
+            return np.fromiter((word2idx.get(w, oov) for w in tokens), dtype=np.intp, count=len(tokens))
+        return self.word2idx.indices(tokens, self.oov_index)
+
+    @staticmethod
+    def _softmax(scores):
+        # This is a simplified version of the "softmax" function
+        exp_scores = np.exp(scores - scores.max(axis=1, keepdims=True)) # Subtract max for numerical stability
+        return exp_scores / exp_scores.sum(axis=1, keepdims=True)
+
+    def _decide(self, probabilities):
+        """Turns rows of class probabilities into (is_toxic, label) tuples."""
+        # Find the total probability of all toxic classes
+        total_toxic_prob = probabilities[:, self.toxic_mask].sum(axis=1)
+
+        # Find which toxic class was the most likely
+        toxic_classes = [c for c in self.classes if c != self.NON_TOXIC_LABEL]
+        top_toxic = probabilities[:, self.toxic_mask].argmax(axis=1)
+
+        return [
+            (True, toxic_classes[top]) if total > self.TOXICITY_THRESHOLD else (False, 'clean')
+            for total, top in zip(total_toxic_prob.tolist(), top_toxic.tolist())
+        ]
+
+# ==============================================================================
+# --- LAZY SINGLETON ---
+# ==============================================================================
+# The model is no longer loaded at import time, so migrate/check/tests don't pay
+# for it. Web workers can preload it via BlogConfig.ready() (TOXICITY_PRELOAD),
+# which under `gunicorn --preload` happens once in the master and is then
+# shared copy-on-write with every forked worker.
+
+_classifier = None
+_classifier_lock = threading.Lock()
+_last_version_check = 0.0
+_reloading = False
+
+# Filled in by whichever of warm_up() or the first request loads the model.
+load_timings = {}
+
+
+def _load(start_mode):
+    global _classifier, _last_version_check
+    classifier = ToxicityClassifier()
+    load_timings.update({
+        'mode': start_mode,
+        'load_ms': classifier.load_seconds * 1000,
+        'model_loaded': classifier.model_loaded,
+        'version': classifier.version,
+    })
+    _classifier = classifier
+    _last_version_check = time.monotonic()
+    return classifier
+
+
+def _reload(version):
+    """Loads ``version`` in a background thread and swaps it in when ready."""
+    global _classifier, _reloading
+    try:
+        classifier = ToxicityClassifier()
+        if classifier.model_loaded:
+            _classifier = classifier  # a single reference swap; in-flight requests keep the old model
+            timing_logger.info(
+                "Toxicity model hot-reloaded to version %s in %.1f ms.", classifier.version, classifier.load_seconds * 1000,
+            )
+        else:
+            logger.error("Toxicity model version %s failed to load; keeping version %s.", version, _classifier.version)
+    finally:
+        _reloading = False
+
+
+def _check_for_new_version(current):
+    """
+    At most once per TOXICITY_RELOAD_INTERVAL seconds, reads the manifest and
+    starts a background reload if a newer version has been published.
+    """
+    global _last_version_check, _reloading
+    interval = getattr(settings, 'TOXICITY_RELOAD_INTERVAL', 30)
+    if interval <= 0 or time.monotonic() - _last_version_check < interval:
+        return
+    with _classifier_lock:
+        if _reloading or time.monotonic() - _last_version_check < interval:
+            return
+        _last_version_check = time.monotonic()
+        try:
+            latest = current_version(MODEL_ROOT) if current.model_path == MODEL_ROOT else None
+        except (OSError, ValueError, AttributeError, TypeError):
+            # e.g. a manifest caught half-written; try again after the next interval.
+            logger.exception("Could not read the model manifest in %s; keeping version %s.", MODEL_ROOT, current.version)
+            return
+        if latest is None or latest[0] == current.version:
+            return
+        _reloading = True
+    threading.Thread(target=_reload, args=(latest[0],), name='toxicity-model-reload', daemon=True).start()
+
+
+def get_toxicity_classifier():
+    """Returns the current classifier, loading it on first use (thread-safe)."""
+    classifier = _classifier
+    if classifier is None:
+        with _classifier_lock:
+            classifier = _classifier
+            if classifier is None:
+                classifier = _load('cold')
+                timing_logger.info("Toxicity model loaded on first request (cold start) in %.1f ms.", load_timings['load_ms'])
+    _check_for_new_version(classifier)
+    return classifier
+
+
+def warm_up():
+    """
+    Loads the model ahead of the first request and runs one throwaway
+    prediction to fault in the memory-mapped pages. Returns load_timings.
+    """
+    with _classifier_lock:
+        classifier = _classifier or _load('warm')
+    started = time.perf_counter()
+    classifier.predict("warm up the toxicity model")
+    load_timings['first_predict_ms'] = (time.perf_counter() - started) * 1000
+    timing_logger.info(
+        "Toxicity model preloaded (warm start): load %.1f ms, first prediction %.2f ms.",
+        load_timings['load_ms'], load_timings['first_predict_ms'],
+    )
+    return load_timings
+
+
+class _ClassifierProxy:
+    """
+    Forwards attribute access to whichever classifier is current, so a
+    hot-reloaded model is picked up by code holding `toxicity_classifier`.
+    Code that needs the verdict and the model version to agree should call
+    get_toxicity_classifier() once and use that instance.
+    """
+
+    def __getattr__(self, name):
+        return getattr(get_toxicity_classifier(), name)
+
+
+# Singleton Instance (resolved lazily, follows hot reloads)
+toxicity_classifier = _ClassifierProxy()
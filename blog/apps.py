@@ -1,5 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'blog'
\ No newline at end of file
+    name = 'blog'
+
+    def ready(self):
+        from . import signals  # noqa: F401 (connects the cache invalidation receivers)
+
+        # Only web workers opt in (TOXICITY_PRELOAD=1); management commands and
+        # tests keep loading the model lazily, if at all.
+        if getattr(settings, 'TOXICITY_PRELOAD', False):
+            from .ai_toxicity import warm_up
+            warm_up()
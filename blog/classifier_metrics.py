@@ -0,0 +1,135 @@
+"""
+Low-overhead, process-local metrics for ToxicityClassifier.predict.
+
+Every histogram has fixed bucket bounds, so recording a prediction is a few
+bisects and integer increments under one lock. The numbers are per process;
+with several gunicorn workers each worker reports its own view.
+"""
+import threading
+from bisect import bisect_left
+from collections import Counter
+
+# Upper bounds ("le") of each histogram's buckets; a final +Inf bucket is implied.
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+TOKEN_BUCKETS = (0, 5, 10, 20, 40, 60, 80, 100, 150)
+# Total toxic probability minus TOXICITY_THRESHOLD; > 0 means flagged.
+MARGIN_BUCKETS = (-0.6, -0.4, -0.2, -0.1, -0.05, 0.0, 0.05, 0.1, 0.2)
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Yields (upper bound label, cumulative count) pairs, Prometheus style."""
+        running = 0
+        for bound, count in zip(list(self.bounds) + ['+Inf'], self.counts):
+            running += count
+            yield str(bound), running
+
+    def snapshot(self):
+        return {
+            'buckets': [
+                {'le': str(bound), 'count': count}
+                for bound, count in zip(list(self.bounds) + ['+Inf'], self.counts)
+            ],
+            'sum': self.sum,
+            'count': self.count,
+        }
+
+
+class ClassifierMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency = Histogram(LATENCY_BUCKETS)
+            self.tokens = Histogram(TOKEN_BUCKETS)
+            self.margin = Histogram(MARGIN_BUCKETS)
+            self.labels = Counter()
+            self.token_total = 0
+            self.oov_total = 0
+            self.cache_hits = 0
+
+    def record(self, seconds, label, token_count, oov_count=None, margin=None):
+        """
+        Records one prediction. ``oov_count`` and ``margin`` are None when the
+        verdict came from the cache and the comment was not scored.
+        """
+        with self._lock:
+            self.latency.observe(seconds)
+            self.tokens.observe(token_count)
+            self.labels[label] += 1
+            if margin is None:
+                self.cache_hits += 1
+            else:
+                self.margin.observe(margin)
+                self.token_total += token_count
+                self.oov_total += oov_count
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'predictions': self.latency.count,
+                'cache_hits': self.cache_hits,
+                'labels': dict(self.labels),
+                'oov_rate': self.oov_total / self.token_total if self.token_total else 0.0,
+                'latency': self.latency.snapshot(),
+                'tokens': self.tokens.snapshot(),
+                'margin': self.margin.snapshot(),
+            }
+
+    def prometheus(self, model_version=None, cache_stats=None):
+        """Renders the metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def histogram(name, help_text, hist):
+            metric(name, 'histogram', help_text)
+            for le, count in hist.cumulative():
+                lines.append(f'{name}_bucket{{le="{le}"}} {count}')
+            lines.append(f'{name}_sum {hist.sum}')
+            lines.append(f'{name}_count {hist.count}')
+
+        with self._lock:
+            histogram('toxicity_predict_seconds', 'Time spent in ToxicityClassifier.predict.', self.latency)
+            histogram('toxicity_predict_tokens', 'Tokens per classified comment after preprocessing.', self.tokens)
+            histogram('toxicity_threshold_margin', 'Total toxic probability minus the flagging threshold.', self.margin)
+
+            metric('toxicity_predictions_total', 'counter', 'Predictions by final label.')
+            for label, count in sorted(self.labels.items()):
+                lines.append(f'toxicity_predictions_total{{label="{label}"}} {count}')
+
+            metric('toxicity_tokens_total', 'counter', 'Scored tokens, and how many were out of vocabulary.')
+            lines.append(f'toxicity_tokens_total{{kind="all"}} {self.token_total}')
+            lines.append(f'toxicity_tokens_total{{kind="oov"}} {self.oov_total}')
+
+        if cache_stats is not None:
+            metric('toxicity_cache_events_total', 'counter', 'Verdict cache hits, misses and evictions.')
+            for event in ('hits', 'misses', 'evictions'):
+                lines.append(f'toxicity_cache_events_total{{event="{event}"}} {cache_stats[event]}')
+            metric('toxicity_cache_entries', 'gauge', 'Verdicts currently held in the cache.')
+            lines.append(f'toxicity_cache_entries {cache_stats["size"]}')
+
+        if model_version is not None:
+            metric('toxicity_model_info', 'gauge', 'The model version serving predictions.')
+            lines.append(f'toxicity_model_info{{version="{model_version}"}} 1')
+
+        return '\n'.join(lines) + '\n'
+
+
+# Shared by every classifier instance in this process, so hot reloads keep the history.
+classifier_metrics = ClassifierMetrics()
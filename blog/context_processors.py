@@ -1,17 +1,60 @@
-from .models import Notification, Genre ,SiteSettings
+import uuid
+
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from .counters import unread_notification_count
+from .models import Genre ,SiteSettings
+
+# Genres and the SiteSettings row are kept per process and reloaded only when
+# the shared version token changes; the signals in blog/signals.py replace it
+# whenever an admin edits either, so every worker drops its copy.
+SITE_GLOBALS_VERSION_KEY = 'blog:site-globals-version'
+_site_globals = {}
+
+
+def _current_version():
+    version = cache.get(SITE_GLOBALS_VERSION_KEY)
+    if version is None:
+        cache.add(SITE_GLOBALS_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(SITE_GLOBALS_VERSION_KEY)
+    return version
+
+
+def invalidate_site_globals():
+    cache.set(SITE_GLOBALS_VERSION_KEY, uuid.uuid4().hex, None)
+    _site_globals.clear()
+
+
+def _cached(name, load):
+    version = _current_version()
+    entry = _site_globals.get(name)
+    if entry is None or entry[0] != version:
+        entry = _site_globals[name] = (version, load())
+    return entry[1]
+
+
+def site_genres():
+    return _cached('genres', lambda: list(Genre.objects.all()))
+
+
+def site_settings():
+    return _cached('site_settings', lambda: SiteSettings.objects.first())
+
 
-# Rename this function to match what settings.py is looking for
 def extras_context(request):
     """
     This context processor makes extra data available to ALL templates.
+    The values are lazy: a template that never uses one costs nothing.
     """
     context = {
         'unread_notifications_count': 0,
-        'all_genres': Genre.objects.all(),
-        'site_settings': SiteSettings.objects.first() 
+        'all_genres': SimpleLazyObject(site_genres),
+        'site_settings': SimpleLazyObject(site_settings),
     }
 
     if request.user.is_authenticated:
-        context['unread_notifications_count'] = Notification.objects.filter(user=request.user, read=False).count()
-    
-    return context
\ No newline at end of file
+        user = request.user
+        context['unread_notifications_count'] = SimpleLazyObject(lambda: unread_notification_count(user))
+
+    return context
@@ -0,0 +1,315 @@
+"""
+Maintains the denormalized counters: comments per Post, per-author totals
+in AuthorStats, the site-wide stats in blog/site_stats.py and unread
+notifications per Profile.
+
+Post.comment_count counts every comment on the post and
+Post.approved_comment_count only the approved ones. AuthorStats adds these
+up over all of an author's posts, plus the flagged ones and the author's
+post count and first post date. Saves and deletes of single posts and
+comments (including cascades) are tracked by the receivers in
+blog/signals.py. Code that changes comment status with QuerySet.update()
+must call statuses_changed() itself (update_status() does), and code that
+deletes comments without signals must call comments_deleted().
+`manage.py reconcile_comment_counts` and `manage.py rebuild_author_stats`
+repair any drift.
+
+Every change is an atomic F() update, so concurrent requests never lose
+increments.
+"""
+from collections import Counter, defaultdict
+
+from django.db import connections, router, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Least
+from django.utils import timezone
+
+from . import site_stats
+from .models import AuthorStats, Comment, Notification, Post, Profile
+
+APPROVED = 'approved'
+FLAGGED = Comment.MODERATION_STATUSES
+
+
+def _adjust(post_id, total=0, approved=0):
+    fields = {}
+    if total:
+        fields['comment_count'] = F('comment_count') + total
+    if approved:
+        fields['approved_comment_count'] = F('approved_comment_count') + approved
+    if fields:
+        Post.objects.filter(pk=post_id).update(**fields)
+
+
+def _adjust_author(post_id, received=0, approved=0, flagged=0):
+    """Adds to the AuthorStats of the author of ``post_id``, in one UPDATE."""
+    fields = {}
+    if received:
+        fields['comments_received'] = F('comments_received') + received
+    if approved:
+        fields['approved_comments_received'] = F('approved_comments_received') + approved
+    if flagged:
+        fields['flagged_comments_received'] = F('flagged_comments_received') + flagged
+    if fields:
+        author = Post.objects.filter(pk=post_id).values('author_id')
+        AuthorStats.objects.filter(author_id=Subquery(author)).update(**fields)
+
+
+def _status_delta(old, new):
+    """(approved, flagged) change when a comment's status goes from ``old`` to ``new``; None means no row."""
+    return (new == APPROVED) - (old == APPROVED), (new in FLAGGED) - (old in FLAGGED)
+
+
+def load_stored_status(comment):
+    """
+    Before a save or delete: fills in ``comment.loaded_status`` from the
+    database when the instance doesn't know it (built by hand with a pk, or
+    loaded with ``status`` deferred), so an existing comment isn't counted as
+    a new approval or flag.
+    """
+    if comment.loaded_status is None and comment.pk is not None:
+        comment.loaded_status = Comment.objects.filter(pk=comment.pk).values_list('status', flat=True).first()
+
+
+def comment_saved(comment, created):
+    approved, flagged = _status_delta(None if created else comment.loaded_status, comment.status)
+    _adjust(comment.post_id, total=int(created), approved=approved)
+    _adjust_author(comment.post_id, received=int(created), approved=approved, flagged=flagged)
+    site_stats.adjust_totals(comment_count=int(created), moderation_count=flagged)
+    if created:
+        site_stats.count_event(site_stats.COMMENTS, at=comment.created_at)
+    if flagged > 0:
+        site_stats.count_event(site_stats.flag_metric(comment.status, comment.toxicity_label))
+    comment.loaded_status = comment.status
+
+
+def comment_deleted(comment):
+    approved, flagged = _status_delta(comment.loaded_status, None)
+    _adjust(comment.post_id, total=-1, approved=approved)
+    _adjust_author(comment.post_id, received=-1, approved=approved, flagged=flagged)
+    site_stats.adjust_totals(comment_count=-1, moderation_count=flagged)
+
+
+def statuses_changed(changes):
+    """
+    For status changes made with QuerySet.update(), which sends no post_save.
+    ``changes`` holds one (post_id, old_status, new_status, toxicity_label)
+    per changed comment.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    flags = Counter()
+    for post_id, old, new, label in changes:
+        approved, flagged = _status_delta(old, new)
+        deltas[post_id][0] += approved
+        deltas[post_id][1] += flagged
+        if flagged > 0:
+            flags[site_stats.flag_metric(new, label)] += 1
+    for post_id, (approved, flagged) in deltas.items():
+        _adjust(post_id, approved=approved)
+        _adjust_author(post_id, approved=approved, flagged=flagged)
+    site_stats.adjust_totals(moderation_count=sum(flagged for _, flagged in deltas.values()))
+    for metric, n in flags.items():
+        site_stats.count_event(metric, n)
+
+
+def update_status(queryset, status):
+    """
+    Moves the comments of ``queryset`` that aren't in ``status`` yet to it
+    with one UPDATE, keeping the counters in step. Call it in a transaction.
+    Returns (pk, post_id, author_id) for each comment changed.
+    """
+    to_change = queryset.exclude(status=status)
+    rows = list(to_change.select_for_update().values_list('pk', 'post_id', 'author_id', 'status', 'toxicity_label'))
+    to_change.update(status=status, updated_at=timezone.now())
+    statuses_changed((post_id, old, status, label) for _, post_id, _, old, label in rows)
+    return [(pk, post_id, author_id) for pk, post_id, author_id, _, _ in rows]
+
+
+def approve_queryset(queryset):
+    """Bulk-approves ``queryset``, keeping the counters in step. Returns the rows changed."""
+    with transaction.atomic():
+        return len(update_status(queryset, APPROVED))
+
+
+def comments_deleted(rows):
+    """
+    For comments deleted without post_delete signals (see
+    blog.moderation.delete_comments). ``rows`` holds one (post_id, status)
+    per deleted comment.
+    """
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for post_id, status in rows:
+        approved, flagged = _status_delta(status, None)
+        deltas[post_id][0] -= 1
+        deltas[post_id][1] += approved
+        deltas[post_id][2] += flagged
+    for post_id, (total, approved, flagged) in deltas.items():
+        _adjust(post_id, total=total, approved=approved)
+        _adjust_author(post_id, received=total, approved=approved, flagged=flagged)
+    site_stats.adjust_totals(
+        comment_count=sum(d[0] for d in deltas.values()), moderation_count=sum(d[2] for d in deltas.values()),
+    )
+
+
+def _actual_count(filter=Q()):
+    rows = (
+        Comment.objects.filter(filter, post=OuterRef('pk')).order_by()
+        .values('post').annotate(n=Count('pk')).values('n')
+    )
+    return Coalesce(Subquery(rows), Value(0))
+
+
+def drifted_posts():
+    """Posts whose stored counters disagree with their comments, annotated with the true values."""
+    return (
+        Post.objects.annotate(actual_total=_actual_count(), actual_approved=_actual_count(Q(status=APPROVED)))
+        .filter(~Q(comment_count=F('actual_total')) | ~Q(approved_comment_count=F('actual_approved')))
+        .only('pk', 'title', 'comment_count', 'approved_comment_count')
+    )
+
+
+def recount(post_ids):
+    """
+    Recomputes the counters of ``post_ids`` inside the UPDATE itself, so a
+    comment added while reconciling is never overwritten by a stale count.
+    """
+    return Post.objects.filter(pk__in=post_ids).update(
+        comment_count=_actual_count(), approved_comment_count=_actual_count(Q(status=APPROVED)),
+    )
+
+
+def _first_post_at(author):
+    return Subquery(Post.objects.filter(author=author).order_by('created_at').values('created_at')[:1])
+
+
+def post_saved(post, created):
+    if not created:
+        return
+    site_stats.adjust_totals(post_count=1)
+    updated = AuthorStats.objects.filter(pk=post.author_id).update(
+        post_count=F('post_count') + 1,
+        first_post_at=Least(Coalesce(F('first_post_at'), Value(post.created_at)), Value(post.created_at)),
+    )
+    if not updated:  # the author's first post: build the row from scratch
+        rebuild_author_stats([post.author_id])
+
+
+def post_deleted(post):
+    # The post's comments were deleted (and counted off) before it.
+    site_stats.adjust_totals(post_count=-1)
+    AuthorStats.objects.filter(pk=post.author_id).update(
+        post_count=F('post_count') - 1, first_post_at=_first_post_at(post.author_id),
+    )
+
+
+def _per_author(model, author, filter=Q()):
+    rows = (
+        model.objects.filter(filter, **{author: OuterRef('pk')}).order_by()
+        .values(author).annotate(n=Count('pk')).values('n')
+    )
+    return Coalesce(Subquery(rows), Value(0))
+
+
+def rebuild_author_stats(author_ids=None):
+    """
+    Recomputes AuthorStats for ``author_ids`` (default: everyone who has
+    posted) inside the UPDATE itself. Returns the number of rows rebuilt.
+    """
+    authors = Post.objects.order_by().values_list('author_id', flat=True).distinct()
+    stats = AuthorStats.objects.all()
+    if author_ids is not None:
+        authors = authors.filter(author_id__in=author_ids)
+        stats = stats.filter(pk__in=author_ids)
+    AuthorStats.objects.bulk_create([AuthorStats(author_id=pk) for pk in authors], ignore_conflicts=True)
+    return stats.update(
+        post_count=_per_author(Post, 'author'),
+        comments_received=_per_author(Comment, 'post__author'),
+        approved_comments_received=_per_author(Comment, 'post__author', Q(status=APPROVED)),
+        flagged_comments_received=_per_author(Comment, 'post__author', Q(status__in=FLAGGED)),
+        first_post_at=_first_post_at(OuterRef('pk')),
+    )
+
+
+def _adjust_unread(user_id, delta):
+    if delta:
+        Profile.objects.filter(user_id=user_id).update(unread_notification_count=F('unread_notification_count') + delta)
+
+
+def notification_saved(notification, created):
+    was_unread = not created and notification.loaded_read is False
+    _adjust_unread(notification.user_id, (not notification.read) - was_unread)
+    notification.loaded_read = notification.read
+
+
+def notification_deleted(notification):
+    _adjust_unread(notification.user_id, -(notification.loaded_read is False))
+
+
+def delete_rows(model, pks):
+    """
+    Deletes the ``model`` rows with primary keys ``pks`` in a single
+    DELETE statement. Unlike QuerySet.delete() nothing is collected
+    first: no pre/post_delete signals are sent and on_delete cascades are
+    not followed, so the caller adjusts the counters and deletes dependent
+    rows itself. Keep ``pks`` under the database's parameter limit (see
+    blog.moderation._chunked). Returns the number of rows deleted.
+    """
+    if not pks:
+        return 0
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    sql = 'DELETE FROM {} WHERE {} IN ({})'.format(
+        quote(model._meta.db_table), quote(model._meta.pk.column), ', '.join(['%s'] * len(pks)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, list(pks))
+        return cursor.rowcount
+
+
+def delete_notifications(queryset):
+    """Deletes ``queryset`` with one DELETE (no signals), keeping the unread counters in step."""
+    rows = list(queryset.values_list('pk', 'user_id', 'read'))
+    for user_id, n in Counter(user_id for _, user_id, read in rows if not read).items():
+        _adjust_unread(user_id, -n)
+    return delete_rows(Notification, [pk for pk, _, _ in rows])
+
+
+def notifications_created(notifications):
+    """For Notification.objects.bulk_create(), which sends no post_save."""
+    for user_id, n in Counter(n.user_id for n in notifications if not n.read).items():
+        _adjust_unread(user_id, n)
+
+
+def mark_notifications_read(user):
+    """Marks all of ``user``'s notifications read; the counter drops by exactly the rows changed."""
+    with transaction.atomic():
+        changed = Notification.objects.filter(user=user, read=False).update(read=True)
+        _adjust_unread(user.pk, -changed)
+    return changed
+
+
+def get_or_create_profile(user):
+    """
+    Returns ``user``'s Profile, creating it if needed. Profiles are created
+    lazily and _adjust_unread() skips users without one, so a new Profile's
+    unread counter is counted from the notifications (inside the UPDATE, so
+    none created meanwhile is missed) rather than left at the model default.
+    Every place that creates a Profile goes through here.
+    """
+    profile, created = Profile.objects.get_or_create(user=user)
+    if created:
+        unread = (
+            Notification.objects.filter(user_id=user.pk, read=False)
+            .order_by().values('user_id').annotate(n=Count('pk')).values('n')
+        )
+        Profile.objects.filter(pk=profile.pk).update(unread_notification_count=Coalesce(Subquery(unread), Value(0)))
+        profile.refresh_from_db(fields=['unread_notification_count'])
+    return profile
+
+
+def unread_notification_count(user):
+    """One primary-key lookup, however long the notification history is."""
+    count = Profile.objects.filter(user=user).values_list('unread_notification_count', flat=True).first()
+    if count is None:
+        count = get_or_create_profile(user).unread_notification_count
+    return count
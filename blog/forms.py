@@ -2,6 +2,7 @@ from django import forms
 from .models import Post, Comment, Genre, Profile
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
+from .accounts import email_taken, username_taken
 
 class PostForm(forms.ModelForm):
     genre = forms.ModelChoiceField(
@@ -76,15 +77,13 @@ class UserUpdateForm(forms.ModelForm):
 
     def clean_username(self):
         username = self.cleaned_data.get('username')
-        existing_user = User.objects.filter(username=username).exclude(pk=self.user.pk).first()
-        if existing_user:
+        if username_taken(username, exclude_pk=self.user.pk):
             raise forms.ValidationError('This username is already taken.')
         return username
 
     def clean_email(self):
         email = self.cleaned_data.get('email')
-        existing_user = User.objects.filter(email=email).exclude(pk=self.user.pk).first()
-        if existing_user:
+        if email_taken(email, exclude_pk=self.user.pk):
             raise forms.ValidationError('This email is already taken.')
         return email
 
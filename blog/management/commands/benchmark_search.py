@@ -0,0 +1,97 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from blog.models import Post
+from blog.search import PostSearch, fts_enabled, rebuild_index, scan_posts
+
+WORDS = (
+    'moderation community editor python django garden travel recipe music review climate history '
+    'science football design startup privacy database network keyboard coffee mountain river novel '
+    'camera season festival language lesson budget market health sleep running painting theatre'
+).split()
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the FTS5 search against the old icontains scan on synthetic posts. "
+        "Everything runs in a transaction that is rolled back, so the database is left untouched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=5000, help="Synthetic posts to add before measuring.")
+        parser.add_argument('--words', type=int, default=300, help="Words per synthetic post.")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per query (the median is reported).")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('queries', nargs='*', default=['garden', 'python django', 'mountain river coffee'])
+
+    def handle(self, *args, **options):
+        if not fts_enabled():
+            raise CommandError("The database has no FTS5 search table; run migrate on SQLite first.")
+        try:
+            with transaction.atomic():
+                self.populate(options['posts'], options['words'], options['seed'])
+                self.measure(options['queries'], options['repeat'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def populate(self, count, words, seed):
+        rng = random.Random(seed)
+        author = User.objects.create(username=f'search-benchmark-{seed}')
+        # Pseudo-words with a Zipf-like frequency, so common words appear in
+        # most posts and the real WORDS (ranked further down) in a few percent.
+        syllables = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'te', 'vo', 'zi', 'pa', 'do', 'fe']
+        vocabulary = list(dict.fromkeys(
+            ''.join(rng.choices(syllables, k=rng.randint(2, 4))) for _ in range(5000)
+        ))
+        for i, word in enumerate(WORDS):
+            vocabulary.insert(50 + 20 * i, word)
+        weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+
+        def paragraph():
+            return ' '.join(rng.choices(vocabulary, weights, k=words // 3))
+
+        Post.objects.bulk_create(
+            [
+                Post(
+                    title=' '.join(rng.choices(WORDS, k=5)).title(), author=author,
+                    content=''.join(f'<p><strong>{i}.</strong> {paragraph()}</p>' for i in range(3)),
+                )
+                for _ in range(count)
+            ],
+            batch_size=500,
+        )
+        started = time.perf_counter()
+        indexed = rebuild_index()
+        self.stdout.write(f"Indexed {indexed} posts in {time.perf_counter() - started:.2f}s.\n")
+
+    def measure(self, queries, repeat):
+        def timed(fn):
+            runs = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                result = fn()
+                runs.append(time.perf_counter() - started)
+            return statistics.median(runs) * 1000, result
+
+        self.stdout.write(
+            f"{'Query':<28}{'Scan (ms)':>12}{'FTS5 (ms)':>12}{'Speed-up':>10}{'Scan hits':>11}{'FTS5 hits':>11}"
+        )
+        for query in queries:
+            # The old view rendered every matching post; the new one counts and renders one page.
+            scan_ms, scan_hits = timed(lambda: len(list(scan_posts(query))))
+            fts_ms, fts_hits = timed(lambda: (PostSearch(query).count(), PostSearch(query)[0:10])[0])
+            # Hit counts differ by design: the scan matches the raw substring
+            # (HTML included), FTS5 every word as a stemmed prefix.
+            self.stdout.write(
+                f"{query:<28}{scan_ms:>12.2f}{fts_ms:>12.2f}{scan_ms / fts_ms:>9.1f}x{scan_hits:>11}{fts_hits:>11}"
+            )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.ai_toxicity import LEGACY_MODEL_PATH, MODEL_ROOT
+from blog.model_artifacts import convert_pickle
+
+
+class Command(BaseCommand):
+    help = "Converts a pickled Naive Bayes model and publishes it as a new memory-mapped model version."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--input', default=LEGACY_MODEL_PATH, help="Path to the legacy .pkl model.")
+        parser.add_argument('--output', default=MODEL_ROOT, help="Versioned model root to publish into.")
+        parser.add_argument('--model-version', help="Version name (defaults to a UTC timestamp).")
+
+    def handle(self, *args, **options):
+        try:
+            version = convert_pickle(options['input'], options['output'], options['model_version'])
+        except FileNotFoundError as e:
+            raise CommandError(f"Model file not found: {e.filename}")
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Converted '{options['input']}' and published it as version {version} in '{options['output']}'."
+        ))
@@ -0,0 +1,49 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError
+
+from blog.ai_toxicity import warm_up
+from blog.moderation import process_pending_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Classifies comments saved with status 'pending_classification' "
+        "(TOXICITY_ASYNC_MODERATION mode). Several workers may run at once: on SQLite they apply their "
+        "batches one at a time, and a comment another worker already applied is skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Comments fetched and classified per batch.")
+        parser.add_argument('--workers', type=int, default=0, help="Scoring processes (0 scores in this process).")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Drain the queue once and exit instead of polling.")
+
+    def handle(self, *args, **options):
+        # Load the model before forking so the pool shares it copy-on-write.
+        warm_up()
+        pool = ProcessPoolExecutor(max_workers=options['workers']) if options['workers'] > 0 else None
+        try:
+            while True:
+                try:
+                    counts = process_pending_batch(batch_size=options['batch_size'], pool=pool)
+                except OperationalError as exc:
+                    # e.g. SQLite's "database is locked" once the busy timeout
+                    # runs out; the batch was rolled back, so poll again.
+                    self.stderr.write(f"Batch failed ({exc}); retrying.")
+                    time.sleep(options['poll_interval'])
+                    continue
+                if counts['approved'] or counts['flagged']:
+                    self.stdout.write(f"Approved {counts['approved']}, flagged {counts['flagged']}.")
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.stdout.write(self.style.SUCCESS("Moderation worker stopped."))
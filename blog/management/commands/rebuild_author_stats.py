@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog.counters import rebuild_author_stats
+
+
+class Command(BaseCommand):
+    help = "Recomputes every author's AuthorStats row from their posts and comments."
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_author_stats()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {rebuilt} author(s)."))
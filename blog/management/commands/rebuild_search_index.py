@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.search import fts_enabled, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index (blog_post_fts) from every post."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Posts inserted per batch.")
+
+    def handle(self, *args, **options):
+        if not fts_enabled():
+            raise CommandError("The database has no FTS5 search table; run migrate on SQLite first.")
+        indexed = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} post(s)."))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from blog.counters import drifted_posts, recount
+
+
+class Command(BaseCommand):
+    help = "Finds posts whose denormalized comment counters have drifted and recounts them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report drifted posts.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Posts recounted per UPDATE.")
+
+    def handle(self, *args, **options):
+        drifted = list(drifted_posts())
+        for post in drifted:
+            self.stdout.write(
+                f"Post {post.pk} '{post.title}': total {post.comment_count} -> {post.actual_total}, "
+                f"approved {post.approved_comment_count} -> {post.actual_approved}"
+            )
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("All comment counters are correct."))
+            return
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{len(drifted)} post(s) have drifted counters (dry run)."))
+            return
+
+        ids = [post.pk for post in drifted]
+        size = options['batch_size']
+        for i in range(0, len(ids), size):
+            recount(ids[i:i + size])
+        self.stdout.write(self.style.SUCCESS(f"Recounted {len(ids)} post(s)."))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from blog.site_stats import get_site_stats, prune_buckets, rebuild_comment_buckets, rebuild_totals
+
+
+class Command(BaseCommand):
+    help = "Recounts the admin dashboard's site totals and hourly comment buckets, and prunes old buckets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help="Days of hourly comment buckets to recompute.")
+        parser.add_argument('--keep-days', type=int, default=90, help="Delete hourly buckets older than this.")
+
+    def handle(self, *args, **options):
+        before = get_site_stats()
+        rebuild_totals()
+        after = get_site_stats()
+        for field in ('post_count', 'comment_count', 'user_count', 'moderation_count'):
+            old, new = getattr(before, field), getattr(after, field)
+            if old != new:
+                self.stdout.write(f"{field}: {old} -> {new}")
+
+        rebuild_comment_buckets(options['days'])
+        pruned = prune_buckets(options['keep_days'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Site totals recounted; comment buckets rebuilt for {options['days']} day(s); {pruned} old bucket(s) pruned."
+        ))
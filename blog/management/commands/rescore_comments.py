@@ -0,0 +1,86 @@
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.ai_toxicity import get_toxicity_classifier, warm_up
+from blog.moderation import apply_rescore, iter_rescore_chunks, score_rows
+from blog.training import map_bounded
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-classifies stored comments with the current toxicity model and moves them between "
+        "'approved' and 'pending_review' to match. Reports, rejections and comments a moderator "
+        "approved despite a flag are left alone. Resumable with --checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help="Comments read, scored and written per chunk.")
+        parser.add_argument('--workers', type=int, default=0, help="Scoring processes (0 scores in this process).")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change without writing anything.")
+        parser.add_argument('--all', action='store_true', help="Also rescore comments the current model version already scored.")
+        parser.add_argument('--checkpoint', help="File holding the last comment id done; read on start, written after every chunk.")
+        parser.add_argument('--start-after', type=int, help="Start after this comment id (overrides the checkpoint).")
+        parser.add_argument('--show', type=int, default=20, help="Changed comments to list individually.")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        checkpoint = options['checkpoint']
+        start = options['start_after']
+        if start is None:
+            start = self.read_checkpoint(checkpoint) if checkpoint else 0
+
+        # Load the model before forking so the pool shares it copy-on-write.
+        warm_up()
+        version = get_toxicity_classifier().version
+        chunks = iter_rescore_chunks(start, options['chunk_size'], skip_version=None if options['all'] else version)
+
+        workers = options['workers']
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+        scanned, last_id = 0, start
+        transitions, shown = Counter(), 0
+        try:
+            for rows, verdicts in map_bounded(pool, score_rows, ((chunk,) for chunk in chunks), 2 * workers):
+                for pk, old, new, old_label, new_label in apply_rescore(rows, verdicts, dry_run=options['dry_run']):
+                    transitions[(old, new, new_label)] += 1
+                    if shown < options['show']:
+                        self.stdout.write(f"  #{pk}: {old} ({old_label or '-'}) -> {new} ({new_label or '-'})")
+                        shown += 1
+                scanned += len(rows)
+                last_id = rows[-1][0]
+                if checkpoint and not options['dry_run']:
+                    self.write_checkpoint(checkpoint, last_id)
+        except KeyboardInterrupt:
+            self.stdout.write(f"Interrupted after comment #{last_id}; rerun with --start-after {last_id} to resume.")
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        for (old, new, label), n in sorted(transitions.items(), key=lambda item: -item[1]):
+            self.stdout.write(f"{n:>8}  {old} -> {new}" + (f" ({label})" if label else ""))
+        verb = "would change" if options['dry_run'] else "changed"
+        self.stdout.write(self.style.SUCCESS(
+            f"Rescored {scanned} comments with model {version}: {sum(transitions.values())} {verb}. "
+            f"Last comment id: {last_id}."
+        ))
+
+    @staticmethod
+    def read_checkpoint(path):
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            try:
+                return int(f.read().strip() or 0)
+            except ValueError:
+                raise CommandError(f"Checkpoint {path} doesn't hold a comment id.")
+
+    @staticmethod
+    def write_checkpoint(path, last_id):
+        # Write-then-rename, so an interrupted run never leaves a torn checkpoint.
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(f'{last_id}\n')
+        os.replace(tmp, path)
@@ -0,0 +1,89 @@
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.ai_toxicity import LEGACY_MODEL_PATH, MODEL_ROOT
+from blog.model_artifacts import publish_artifacts
+from blog.training import evaluate, iter_chunks, train
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'balanced_3class_toxic_dataset.csv')
+
+
+def safe_divide(numerator, denominator): return numerator / denominator if denominator != 0 else 0
+
+
+class Command(BaseCommand):
+    help = "Trains the Naive Bayes toxicity model from a CSV dataset and publishes it as a new model version."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', default=DATASET_PATH, help="CSV with 'comment_text' and 'label' columns.")
+        parser.add_argument('--chunk-size', type=int, default=10_000, help="Rows read and counted per chunk.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Tokenizer processes (1 = no pool).")
+        parser.add_argument('--test-fraction', type=float, default=0.2, help="Share of rows held out for evaluation.")
+        parser.add_argument('--seed', type=int, default=42, help="Seed for the train/test split.")
+        parser.add_argument('--output', default=MODEL_ROOT, help="Versioned model root to publish into.")
+        parser.add_argument('--model-version', help="Version name (defaults to a UTC timestamp).")
+        parser.add_argument('--pickle', default=LEGACY_MODEL_PATH, help="Also write the legacy pickle here ('' to skip).")
+        parser.add_argument('--skip-eval', action='store_true', help="Don't evaluate on the held-out rows.")
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['dataset']):
+            raise CommandError(f"Dataset not found: {options['dataset']}")
+
+        def chunks():
+            return iter_chunks(options['dataset'], options['chunk_size'], options['test_fraction'], options['seed'])
+
+        workers = options['workers']
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            started = time.perf_counter()
+            artifacts = train(chunks(), pool=pool, max_pending=2 * workers)
+            self.stdout.write(
+                f"Trained on {sum(artifacts['total_words_per_class'].values())} token slots, "
+                f"vocabulary of {len(artifacts['word2idx'])} words, in {time.perf_counter() - started:.1f}s."
+            )
+            if not options['skip_eval']:
+                self.report(evaluate(artifacts, chunks(), pool=pool, max_pending=2 * workers), artifacts['classes'])
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        if options['pickle']:
+            with open(options['pickle'], 'wb') as f:
+                pickle.dump(artifacts, f)
+        version = publish_artifacts(artifacts, options['output'], options['model_version'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Model trained and published as version {version} in '{options['output']}'."
+        ))
+
+    def report(self, conf_matrix, classes):
+        write = self.stdout.write
+
+        write("\n--- Confusion Matrix ---")
+        header = f"{'Actual ↓ | Predicted →':<20}" + " | ".join([f"{c:<15}" for c in classes])
+        write(header)
+        write("-" * len(header))
+        for true_class in classes:
+            row = [str(conf_matrix[true_class][pred_class]) for pred_class in classes]
+            write(f"{true_class:<20}" + " | ".join([f"{r:<15}" for r in row]))
+
+        write("\n--- Classification Report ---")
+        write(f"{'Class':<20}{'Precision':<15}{'Recall':<15}{'F1-Score':<15}")
+        write("---------------------------------------------------------------")
+        for c in classes:
+            TP = conf_matrix[c][c]
+            FP = sum(conf_matrix[other_class][c] for other_class in classes if other_class != c)
+            FN = sum(conf_matrix[c][other_class] for other_class in classes if other_class != c)
+            precision = safe_divide(TP, TP + FP)
+            recall = safe_divide(TP, TP + FN)
+            f1_score = safe_divide(2 * precision * recall, precision + recall)
+            write(f"{c:<20}{precision:<15.4f}{recall:<15.4f}{f1_score:<15.4f}")
+        write("---------------------------------------------------------------")
+
+        total_correct = sum(conf_matrix[c][c] for c in classes)
+        total_samples = sum(sum(row.values()) for row in conf_matrix.values())
+        accuracy = safe_divide(total_correct, total_samples)
+        write(f"\nOverall Accuracy: {accuracy:.4f} ({total_correct} out of {total_samples} correct)\n")
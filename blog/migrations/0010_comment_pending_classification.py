@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0009_sitesettings"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="comment",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("approved", "Approved"),
+                    ("pending_classification", "Pending Classification"),
+                    ("pending_review", "Pending Review"),
+                    ("reported", "Reported"),
+                    ("rejected", "Rejected"),
+                ],
+                default="approved",
+                max_length=30,
+            ),
+        ),
+    ]
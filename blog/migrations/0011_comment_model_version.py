@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0010_comment_pending_classification"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="model_version",
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+    ]
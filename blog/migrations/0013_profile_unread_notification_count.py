@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:44
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_unread_counts(apps, schema_editor):
+    Notification = apps.get_model("blog", "Notification")
+    Profile = apps.get_model("blog", "Profile")
+    unread = (
+        Notification.objects.filter(user=OuterRef("user"), read=False)
+        .order_by()
+        .values("user")
+        .annotate(n=Count("pk"))
+        .values("n")
+    )
+    Profile.objects.update(
+        unread_notification_count=Coalesce(Subquery(unread), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0012_post_comment_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="unread_notification_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_unread_counts, migrations.RunPython.noop),
+    ]
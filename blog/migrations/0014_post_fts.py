@@ -0,0 +1,42 @@
+# Full-text index for search_results (see blog/search.py).
+
+import html
+
+from django.db import migrations
+from django.utils.html import strip_tags
+
+
+def create_post_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    Post = apps.get_model("blog", "Post")
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS blog_post_fts USING fts5("
+        "title, body, tokenize = 'porter unicode61 remove_diacritics 2')"
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO blog_post_fts (rowid, title, body) VALUES (%s, %s, %s)",
+            [
+                (pk, title, html.unescape(strip_tags(content or "")))
+                for pk, title, content in Post.objects.values_list(
+                    "pk", "title", "content"
+                )
+            ],
+        )
+
+
+def drop_post_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS blog_post_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0013_profile_unread_notification_count"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_post_fts, drop_post_fts),
+    ]
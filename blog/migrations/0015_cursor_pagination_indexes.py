@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0014_post_fts"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                condition=models.Q(("status__in", ("pending_review", "reported"))),
+                fields=["-created_at", "-id"],
+                name="comment_moderation_queue_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(fields=["-created_at", "-id"], name="post_created_idx"),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    auth_user.email has no index of its own; the availability checks in
+    blog/accounts.py look users up by it.
+
+    This changes a table owned by django.contrib.auth, so the index is created
+    with raw SQL (the auth User model can't declare it) and named with a blog_
+    prefix. Unapplying the migration drops it again.
+    """
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("blog", "0016_composite_indexes"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="CREATE INDEX IF NOT EXISTS blog_auth_user_email_idx ON auth_user (email)",
+            reverse_sql="DROP INDEX IF EXISTS blog_auth_user_email_idx",
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0017_auth_user_email_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="comment",
+            name="comment_author_created_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="post",
+            name="post_author_created_idx",
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["author", "-created_at", "-id"],
+                name="comment_author_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["author", "status", "-created_at", "-id"],
+                name="comment_author_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["author", "-created_at", "-id"], name="post_author_created_idx"
+            ),
+        ),
+    ]
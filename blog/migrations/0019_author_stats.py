@@ -0,0 +1,72 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_author_stats(apps, schema_editor):
+    AuthorStats = apps.get_model("blog", "AuthorStats")
+    Comment = apps.get_model("blog", "Comment")
+    Post = apps.get_model("blog", "Post")
+
+    def count(model, author, filter=Q()):
+        rows = (
+            model.objects.filter(filter, **{author: OuterRef("pk")})
+            .order_by()
+            .values(author)
+            .annotate(n=Count("pk"))
+            .values("n")
+        )
+        return Coalesce(Subquery(rows), Value(0))
+
+    authors = Post.objects.order_by().values_list("author_id", flat=True).distinct()
+    AuthorStats.objects.bulk_create([AuthorStats(author_id=pk) for pk in authors])
+    first_post = (
+        Post.objects.filter(author=OuterRef("pk"))
+        .order_by("created_at")
+        .values("created_at")[:1]
+    )
+    AuthorStats.objects.update(
+        post_count=count(Post, "author"),
+        comments_received=count(Comment, "post__author"),
+        approved_comments_received=count(Comment, "post__author", Q(status="approved")),
+        flagged_comments_received=count(
+            Comment, "post__author", Q(status__in=("pending_review", "reported"))
+        ),
+        first_post_at=Subquery(first_post),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("blog", "0018_dashboard_tab_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuthorStats",
+            fields=[
+                (
+                    "author",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="author_stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("post_count", models.IntegerField(default=0)),
+                ("comments_received", models.IntegerField(default=0)),
+                ("approved_comments_received", models.IntegerField(default=0)),
+                ("flagged_comments_received", models.IntegerField(default=0)),
+                ("first_post_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_author_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.4 on 2026-10-17 07:02
+
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+
+def backfill_site_stats(apps, schema_editor):
+    Comment = apps.get_model("blog", "Comment")
+    HourlyStat = apps.get_model("blog", "HourlyStat")
+    Post = apps.get_model("blog", "Post")
+    SiteStats = apps.get_model("blog", "SiteStats")
+    User = apps.get_model("auth", "User")
+
+    SiteStats.objects.create(
+        pk=1,
+        post_count=Post.objects.count(),
+        comment_count=Comment.objects.count(),
+        user_count=User.objects.count(),
+        moderation_count=Comment.objects.filter(
+            status__in=("pending_review", "reported")
+        ).count(),
+    )
+    # A week of comment history for the trends; flag events weren't recorded.
+    since = (timezone.now() - timedelta(days=7)).replace(
+        minute=0, second=0, microsecond=0
+    )
+    per_hour = (
+        Comment.objects.filter(created_at__gte=since)
+        .order_by()
+        .annotate(bucket=TruncHour("created_at", tzinfo=dt_timezone.utc))
+        .values("bucket")
+        .annotate(n=Count("pk"))
+    )
+    HourlyStat.objects.bulk_create(
+        HourlyStat(hour=row["bucket"], metric="comments", count=row["n"])
+        for row in per_hour
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("blog", "0019_author_stats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SiteStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("post_count", models.IntegerField(default=0)),
+                ("comment_count", models.IntegerField(default=0)),
+                ("user_count", models.IntegerField(default=0)),
+                ("moderation_count", models.IntegerField(default=0)),
+            ],
+            options={
+                "verbose_name_plural": "Site Stats",
+            },
+        ),
+        migrations.CreateModel(
+            name="HourlyStat",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("hour", models.DateTimeField()),
+                ("metric", models.CharField(max_length=80)),
+                ("count", models.IntegerField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("hour", "metric"), name="hourlystat_hour_metric_uniq"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_site_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,235 @@
+"""
+Pickle-free, memory-mappable storage for the toxicity model.
+
+A model directory contains:
+
+    meta.json          classes, priors, alpha, stop words, ...
+    likelihoods.npy    float64 (classes x vocab+1); the last column is the
+                       per-class out-of-vocabulary penalty
+    vocab.bin          every vocabulary word, sorted, concatenated as UTF-8
+    vocab_offsets.npy  int64 (vocab+1) start offsets of each word in vocab.bin
+    vocab_prefix.npy   fixed-width prefix of each word, used for searchsorted
+
+All arrays are opened read-only with ``np.memmap`` so every worker process
+shares the same page-cache pages instead of holding its own copy.
+
+Model directories are published as versions under a model root:
+
+    manifest.json      {"current": "<version>", "versions": [...]}
+    <version>/         one model directory per published version
+
+Publishing writes the new version's directory first and then atomically
+replaces manifest.json, so readers always see a complete model.
+"""
+import json
+import os
+import pickle
+from datetime import datetime, timezone
+
+import numpy as np
+
+FORMAT_VERSION = 1
+PREFIX_WIDTH = 16
+
+META_FILE = 'meta.json'
+LIKELIHOODS_FILE = 'likelihoods.npy'
+VOCAB_FILE = 'vocab.bin'
+OFFSETS_FILE = 'vocab_offsets.npy'
+PREFIX_FILE = 'vocab_prefix.npy'
+MANIFEST_FILE = 'manifest.json'
+
+
+class MappedVocabulary:
+    """
+    Read-only word -> index lookup over the sorted vocabulary blob.
+
+    Behaves like the ``word2idx`` dict for ``get``/``in``/``len``, and adds
+    ``indices`` to look up a whole token list with one ``searchsorted``.
+    """
+
+    def __init__(self, blob, offsets, prefixes):
+        self.blob = blob
+        self.offsets = offsets
+        self.prefixes = prefixes
+        self.width = prefixes.dtype.itemsize
+
+    def __len__(self):
+        return len(self.prefixes)
+
+    def __contains__(self, word):
+        return self.get(word) is not None
+
+    def get(self, word, default=None):
+        index = int(self.indices([word], -1)[0])
+        return default if index < 0 else index
+
+    def word(self, index):
+        return self.blob[self.offsets[index]:self.offsets[index + 1]].tobytes().decode('utf-8')
+
+    def indices(self, tokens, default):
+        """Returns an intp array with the vocabulary index of each token, or ``default``."""
+        n = len(self.prefixes)
+        if not tokens or not n:
+            return np.full(len(tokens), default, dtype=np.intp)
+
+        encoded = [t.encode('utf-8') for t in tokens]
+        keys = np.array(encoded, dtype=self.prefixes.dtype)  # truncates to the prefix width
+        positions = np.searchsorted(self.prefixes, keys)
+        clipped = np.minimum(positions, n - 1)
+        found = (positions < n) & (self.prefixes[clipped] == keys)
+
+        result = np.where(found, clipped, default).astype(np.intp)
+
+        # Words longer than the prefix width may share a prefix with their
+        # neighbours, so confirm those against the full bytes in the blob.
+        for i, word in enumerate(encoded):
+            if len(word) < self.width or not found[i]:
+                continue
+            result[i] = default
+            p = int(positions[i])
+            while p < n and self.prefixes[p] == keys[i]:
+                if self.blob[self.offsets[p]:self.offsets[p + 1]].tobytes() == word:
+                    result[i] = p
+                    break
+                p += 1
+        return result
+
+
+def is_artifact_dir(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, META_FILE))
+
+
+def is_model_root(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+
+def read_manifest(root):
+    """Returns the parsed manifest of a model root, or None if there is none."""
+    try:
+        with open(os.path.join(root, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def current_version(root):
+    """Returns ``(version, directory)`` for the root's current model, or None."""
+    manifest = read_manifest(root)
+    if not manifest or not manifest.get('current'):
+        return None
+    return manifest['current'], os.path.join(root, manifest['current'])
+
+
+def _write_atomic(path, write):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def save_artifacts(artifacts, directory):
+    """
+    Writes the pickle-style ``artifacts`` dict (as produced by training.py)
+    to ``directory`` in the memory-mappable format.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    classes = list(artifacts['classes'])
+    word2idx = artifacts['word2idx']
+    vocab = sorted(word2idx, key=word2idx.get)
+    if vocab != sorted(vocab) or [word2idx[w] for w in vocab] != list(range(len(vocab))):
+        raise ValueError("word2idx must map the sorted vocabulary to 0..n-1.")
+
+    alpha = artifacts['alpha']
+    totals = np.array([artifacts['total_words_per_class'][c] for c in classes], dtype=np.float64)
+    likelihoods = np.hstack([
+        np.vstack([np.asarray(artifacts['likelihoods'][c], dtype=np.float64) for c in classes]),
+        np.log(alpha / totals)[:, None],
+    ])
+
+    encoded = [w.encode('utf-8') for w in vocab]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(w) for w in encoded])
+    prefixes = np.array(encoded, dtype=f'S{PREFIX_WIDTH}')
+
+    _write_atomic(os.path.join(directory, LIKELIHOODS_FILE), lambda f: np.save(f, likelihoods))
+    _write_atomic(os.path.join(directory, VOCAB_FILE), lambda f: f.write(b''.join(encoded)))
+    _write_atomic(os.path.join(directory, OFFSETS_FILE), lambda f: np.save(f, offsets))
+    _write_atomic(os.path.join(directory, PREFIX_FILE), lambda f: np.save(f, prefixes))
+
+    # meta.json goes last: its presence marks the directory as complete.
+    meta = {
+        'format': FORMAT_VERSION,
+        'classes': classes,
+        'priors': [float(artifacts['priors'][c]) for c in classes],
+        'total_words_per_class': [int(artifacts['total_words_per_class'][c]) for c in classes],
+        'alpha': alpha,
+        'vocab_size': len(vocab),
+        'stop_words': sorted(artifacts['stop_words']),
+        'non_toxic_label': artifacts.get('non_toxic_label', 'non-toxic'),
+    }
+    _write_atomic(os.path.join(directory, META_FILE), lambda f: f.write(json.dumps(meta, indent=2).encode('utf-8')))
+
+
+def load_artifacts(directory):
+    """
+    Opens a model directory read-only. Returns a dict with the same keys as
+    the pickle, plus ``likelihood_matrix`` (the memmapped classes x vocab+1
+    array); ``word2idx`` is a MappedVocabulary rather than a dict.
+    """
+    with open(os.path.join(directory, META_FILE), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('format') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model format: {meta.get('format')!r}")
+
+    classes = meta['classes']
+    likelihood_matrix = np.load(os.path.join(directory, LIKELIHOODS_FILE), mmap_mode='r')
+    offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode='r')
+    prefixes = np.load(os.path.join(directory, PREFIX_FILE), mmap_mode='r')
+    blob_path = os.path.join(directory, VOCAB_FILE)
+    blob = np.memmap(blob_path, dtype=np.uint8, mode='r') if os.path.getsize(blob_path) else np.empty(0, np.uint8)
+
+    if likelihood_matrix.shape != (len(classes), meta['vocab_size'] + 1) or len(prefixes) != meta['vocab_size']:
+        raise ValueError(f"Model files in {directory} do not match meta.json.")
+
+    return {
+        'classes': classes,
+        'priors': dict(zip(classes, meta['priors'])),
+        'likelihoods': {c: likelihood_matrix[i, :-1] for i, c in enumerate(classes)},
+        'likelihood_matrix': likelihood_matrix,
+        'word2idx': MappedVocabulary(blob, offsets, prefixes),
+        'total_words_per_class': dict(zip(classes, meta['total_words_per_class'])),
+        'alpha': meta['alpha'],
+        'stop_words': frozenset(meta['stop_words']),
+        'non_toxic_label': meta['non_toxic_label'],
+    }
+
+
+def publish_artifacts(artifacts, root, version=None):
+    """
+    Saves ``artifacts`` as a new version under ``root`` and makes it current.
+    Running classifiers notice the manifest change and hot-reload it.
+    """
+    if version is None:
+        version = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+    directory = os.path.join(root, version)
+    if os.path.exists(directory):
+        raise ValueError(f"Model version {version!r} already exists in {root}.")
+    save_artifacts(artifacts, directory)
+
+    manifest = read_manifest(root) or {'versions': []}
+    manifest['versions'].append({
+        'version': version,
+        'published_at': datetime.now(timezone.utc).isoformat(),
+        'vocab_size': len(artifacts['word2idx']),
+    })
+    manifest['current'] = version
+    _write_atomic(os.path.join(root, MANIFEST_FILE), lambda f: f.write(json.dumps(manifest, indent=2).encode('utf-8')))
+    return version
+
+
+def convert_pickle(pickle_path, root, version=None):
+    """Publishes a legacy naive_bayes_model.pkl as a new version under ``root``."""
+    with open(pickle_path, 'rb') as f:
+        artifacts = pickle.load(f)
+    return publish_artifacts(artifacts, root, version)
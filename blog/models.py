@@ -9,6 +9,8 @@ class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     image = models.ImageField(default='default.jpg', upload_to='profile_pics')
     bio = models.TextField(max_length=500, blank=True) # <-- ADD THIS LINE
+    # Unread notifications for the navbar badge, maintained by blog/counters.py.
+    unread_notification_count = models.IntegerField(default=0, editable=False)
 
     def __str__(self):
         return f'{self.user.username} Profile'
@@ -27,6 +29,17 @@ class Post(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized counters, maintained by blog/counters.py.
+    comment_count = models.IntegerField(default=0, editable=False)
+    approved_comment_count = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='post_created_idx'),  # cursor pagination
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_created_idx'),
+            models.Index(fields=['-comment_count', '-created_at'], name='post_comment_count_idx'),
+            models.Index(fields=['-approved_comment_count', '-created_at'], name='post_approved_count_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -44,10 +57,13 @@ class Comment(models.Model):
     # Define the choices for the new status field
     STATUS_CHOICES = (
         ('approved', 'Approved'),
+        ('pending_classification', 'Pending Classification'),  # Saved, waiting for the background classifier
         ('pending_review', 'Pending Review'),
         ('reported', 'Reported'),  # For toxic comments
         ('rejected', 'Rejected'),             # Optional status for admins
     )
+    # Statuses that put a comment in the admin moderation queue.
+    MODERATION_STATUSES = ('pending_review', 'reported')
 
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -57,16 +73,57 @@ class Comment(models.Model):
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
     
     # The new, single field for status
-    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='approved')
+    status = models.CharField(max_length=30, choices=STATUS_CHOICES, default='approved')
     
     # We still keep these for context
     toxicity_label = models.CharField(max_length=50, null=True, blank=True)
+    model_version = models.CharField(max_length=40, null=True, blank=True)  # Model version that last scored this comment
     is_edited = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-created_at', '-id'], name='comment_status_created_idx'),
+            models.Index(fields=['post', 'status', 'created_at'], name='comment_post_status_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='comment_author_created_idx'),
+            models.Index(fields=['author', 'status', '-created_at', '-id'], name='comment_author_status_idx'),
+        ]
+
+    # Status as last read from or written to the database (None for unsaved
+    # comments), so the post counters can tell whether a save changed it.
+    loaded_status = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_status = instance.__dict__.get('status')
+        return instance
+
     def __str__(self):
         return f"Comment by {self.author} on {self.post.title}"
 
 
+class AuthorStats(models.Model):
+    """Per-author totals for the dashboard, maintained by blog/counters.py."""
+    author = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='author_stats')
+    post_count = models.IntegerField(default=0)
+    comments_received = models.IntegerField(default=0)
+    approved_comments_received = models.IntegerField(default=0)
+    # Comments on the author's posts waiting in the moderation queue (Comment.MODERATION_STATUSES).
+    flagged_comments_received = models.IntegerField(default=0)
+    first_post_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def flagged_rate(self):
+        return self.flagged_comments_received / self.comments_received if self.comments_received else 0.0
+
+    @property
+    def comments_per_post(self):
+        return self.comments_received / self.post_count if self.post_count else 0.0
+
+    def __str__(self):
+        return f"Stats for {self.author}"
+
+
 class Notification(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
     message = models.CharField(max_length=255)
@@ -74,6 +131,21 @@ class Notification(models.Model):
     read = models.BooleanField(default=False)
     comment = models.ForeignKey(Comment, on_delete=models.CASCADE, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'read', '-created_at'], name='notification_user_read_idx'),
+        ]
+
+    # Read flag as last read from or written to the database (None for unsaved
+    # notifications), so the unread counter can tell whether a save changed it.
+    loaded_read = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_read = instance.__dict__.get('read')
+        return instance
+
     def __str__(self):
         return f"Notification for {self.user}: {self.message}"
     
@@ -89,4 +161,36 @@ class SiteSettings(models.Model):
         return "Site Settings"
 
     class Meta:
-        verbose_name_plural = "Site Settings"
\ No newline at end of file
+        verbose_name_plural = "Site Settings"
+
+class SiteStats(models.Model):
+    """
+    Site-wide totals for the admin dashboard (a single row), maintained by
+    blog/site_stats.py.
+    """
+    post_count = models.IntegerField(default=0)
+    comment_count = models.IntegerField(default=0)
+    user_count = models.IntegerField(default=0)
+    # Comments in Comment.MODERATION_STATUSES.
+    moderation_count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Site Stats"
+
+    def __str__(self):
+        return "Site Stats"
+
+
+class HourlyStat(models.Model):
+    """How many times ``metric`` happened in the hour starting at ``hour`` (see blog/site_stats.py)."""
+    hour = models.DateTimeField()
+    metric = models.CharField(max_length=80)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'metric'], name='hourlystat_hour_metric_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.metric} @ {self.hour:%Y-%m-%d %H:00}: {self.count}"
@@ -0,0 +1,282 @@
+"""
+Background moderation for comments saved with status 'pending_classification'.
+
+The Comment table itself is the queue: add_comment (in async mode) saves the
+comment straight away, and the `moderate_comments` management command picks
+pending rows up in batches, classifies them with predict_many and applies the
+same approve / flag / notify rules add_comment uses in synchronous mode.
+
+Moderators' bulk actions (approve / reject / delete, from admin_comments
+and the Django admin) live here too. Each runs in one transaction with one
+UPDATE or DELETE and one bulk_create of notifications, however many
+comments are selected.
+
+`manage.py rescore_comments` re-runs the classifier over stored comments
+(e.g. after a new model version is published) with iter_rescore_chunks /
+score_rows / apply_rescore below.
+"""
+from collections import defaultdict
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from .ai_toxicity import get_toxicity_classifier
+from .counters import (
+    comments_deleted, delete_notifications, delete_rows, notifications_created, statuses_changed, update_status,
+)
+from .models import Comment, Notification, Post
+from .sidebar import invalidate_sidebar
+
+PENDING_CLASSIFICATION = 'pending_classification'
+FLAGGED_MESSAGE = "Your comment on '{title}' is pending review due to: {label}."
+
+
+def _classify(texts):
+    classifier = get_toxicity_classifier()
+    verdicts, _ = classifier.predict_many(texts)
+    return [(is_toxic, label, classifier.version) for is_toxic, label in verdicts]
+
+
+def classify_texts(texts, pool=None, chunk_size=250):
+    """
+    Returns an (is_toxic, label, model_version) tuple per text. With a process
+    ``pool`` (e.g. concurrent.futures.ProcessPoolExecutor) the texts are scored
+    in parallel chunks; otherwise in a single predict_many call.
+    """
+    if pool is None or len(texts) <= chunk_size:
+        return _classify(texts)
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    return [verdict for chunk in pool.map(_classify, chunks) for verdict in chunk]
+
+
+def process_pending_batch(batch_size=500, pool=None):
+    """
+    Classifies up to ``batch_size`` pending comments, oldest first.
+    Returns a dict with the number of comments approved and flagged.
+    """
+    comments = list(
+        Comment.objects.filter(status=PENDING_CLASSIFICATION)
+        .select_related('post')
+        .only('pk', 'text', 'author_id', 'post_id', 'post__title')
+        .order_by('pk')[:batch_size]
+    )
+    if not comments:
+        return {'approved': 0, 'flagged': 0}
+
+    verdicts = classify_texts([c.text for c in comments], pool=pool)
+    now = timezone.now()
+
+    while True:
+        try:
+            outcomes, notifications = _apply_verdicts(comments, verdicts, now)
+            break
+        except _BatchConflict:
+            # Rolled back; re-read which rows are still pending and try again.
+            continue
+    # update() sends no post_save, so newly approved comments wouldn't reach the sidebar.
+    invalidate_sidebar()
+
+    total = sum(len(pks) for pks in outcomes.values())
+    return {'approved': total - len(notifications), 'flagged': len(notifications)}
+
+
+class _BatchConflict(Exception):
+    """A row left 'pending_classification' between the claim and its UPDATE."""
+
+
+def _apply_verdicts(comments, verdicts, now):
+    with transaction.atomic():
+        # Claim the rows that are still pending: skip those deleted, moderated
+        # or claimed by another worker while we were scoring. SQLite has no row
+        # locks; there the IMMEDIATE transaction mode (see settings.DATABASES)
+        # makes this transaction take the write lock up front, so workers
+        # apply their batches one after another.
+        still_pending = set(
+            Comment.objects.select_for_update(skip_locked=True)
+            .filter(pk__in=[c.pk for c in comments], status=PENDING_CLASSIFICATION)
+            .values_list('pk', flat=True)
+        )
+        # One UPDATE per distinct (status, label, model version) outcome.
+        outcomes = defaultdict(list)
+        notifications = []
+        changes = []
+        for comment, (is_toxic, label, version) in zip(comments, verdicts):
+            if comment.pk not in still_pending:
+                continue
+            if is_toxic:
+                outcomes[('pending_review', label, version)].append(comment.pk)
+                notifications.append(Notification(
+                    user_id=comment.author_id,
+                    message=FLAGGED_MESSAGE.format(title=comment.post.title, label=label),
+                    comment_id=comment.pk,
+                ))
+                changes.append((comment.post_id, PENDING_CLASSIFICATION, 'pending_review', label))
+            else:
+                outcomes[('approved', None, version)].append(comment.pk)
+                changes.append((comment.post_id, PENDING_CLASSIFICATION, 'approved', None))
+
+        for (status, label, version), pks in outcomes.items():
+            fields = {'status': status, 'toxicity_label': label, 'model_version': version, 'updated_at': now}
+            # The UPDATE re-checks the status; if it didn't change every claimed
+            # row, the notifications and counters built above are wrong, so
+            # roll the batch back rather than commit them.
+            if Comment.objects.filter(pk__in=pks, status=PENDING_CLASSIFICATION).update(**fields) != len(pks):
+                raise _BatchConflict
+        Notification.objects.bulk_create(notifications)
+        notifications_created(notifications)
+        statuses_changed(changes)
+    return outcomes, notifications
+
+
+APPROVED_MESSAGE = "Your comment on '{title}' has been approved by an admin."
+REJECTED_MESSAGE = "Your comment on '{title}' has been rejected by a moderator."
+
+
+def _set_status(queryset, status, message):
+    with transaction.atomic():
+        changed = update_status(queryset, status)
+        titles = dict(Post.objects.filter(pk__in={post_id for _, post_id, _ in changed}).values_list('pk', 'title'))
+        notifications = [
+            Notification(user_id=author_id, message=message.format(title=titles[post_id]), comment_id=pk)
+            for pk, post_id, author_id in changed
+        ]
+        Notification.objects.bulk_create(notifications, batch_size=500)
+        notifications_created(notifications)
+    invalidate_sidebar()
+    return len(changed)
+
+
+def approve_comments(queryset):
+    """Approves ``queryset`` and notifies the authors. Returns the number of comments changed."""
+    return _set_status(queryset, 'approved', APPROVED_MESSAGE)
+
+
+def reject_comments(queryset):
+    """Rejects ``queryset`` (hidden from readers) and notifies the authors. Returns the number changed."""
+    return _set_status(queryset, 'rejected', REJECTED_MESSAGE)
+
+
+def _chunked(ids, size=500):
+    ids = sorted(ids)
+    return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+
+def delete_comments(queryset):
+    """
+    Deletes ``queryset`` with every reply beneath it. Returns the number of
+    comments deleted, replies included.
+
+    QuerySet.delete() would load each comment and send it through post_delete
+    (a few counter UPDATEs apiece); here the tree is read once per level, the
+    counters are adjusted per post, and the rows go in a DELETE per 500 ids
+    (keeping IN lists under the database's parameter limit).
+    """
+    with transaction.atomic():
+        ids = set(queryset.select_for_update().values_list('pk', flat=True))
+        replies = ids
+        while replies:
+            replies = {
+                pk for chunk in _chunked(replies)
+                for pk in Comment.objects.filter(parent_id__in=chunk).values_list('pk', flat=True)
+            } - ids
+            ids |= replies
+        for chunk in _chunked(ids):
+            comments_deleted(Comment.objects.filter(pk__in=chunk).values_list('post_id', 'status'))
+            delete_notifications(Notification.objects.filter(comment_id__in=chunk))
+            delete_rows(Comment, chunk)  # no post_delete: comments_deleted() did the counters
+    invalidate_sidebar()
+    return len(ids)
+
+
+# A rescore only revisits the classifier's own verdicts: user reports,
+# moderator rejections and comments still waiting for the worker are left alone.
+RESCORABLE_STATUSES = ('approved', 'pending_review')
+RESCORE_FIELDS = ('pk', 'post_id', 'author_id', 'status', 'toxicity_label', 'updated_at', 'text')
+
+
+def iter_rescore_chunks(after_id=0, chunk_size=500, skip_version=None):
+    """
+    Yields lists of up to ``chunk_size`` RESCORE_FIELDS tuples for the
+    rescorable comments with an id above ``after_id``, in id order. Rows are
+    streamed with .iterator(), so memory stays bounded however big the table
+    is. Comments already scored by ``skip_version`` are skipped.
+    """
+    rows = Comment.objects.filter(pk__gt=after_id, status__in=RESCORABLE_STATUSES).order_by('pk')
+    if skip_version:
+        rows = rows.exclude(model_version=skip_version)
+    rows = rows.values_list(*RESCORE_FIELDS).iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        yield chunk
+
+
+def score_rows(rows):
+    """Worker: classifies one chunk from iter_rescore_chunks. Returns (rows, verdicts)."""
+    return rows, _classify([row[-1] for row in rows])
+
+
+def rescore_target(status, label, is_toxic, new_label):
+    """The (status, toxicity_label) a comment should have under a fresh verdict, or None to keep it."""
+    if status == 'approved' and label:
+        # Approved by a moderator despite a flag. Classifier approvals and
+        # re-approved edits clear the label, so only moderators leave one.
+        return None
+    return ('pending_review', new_label) if is_toxic else ('approved', None)
+
+
+def apply_rescore(rows, verdicts, dry_run=False):
+    """
+    Applies fresh classifier ``verdicts`` to ``rows`` (from iter_rescore_chunks):
+    the changed comments go out in one bulk_update, the rest just get the new
+    model_version, and newly flagged comments notify their authors as in
+    add_comment. Returns (pk, old status, new status, old label, new label)
+    per changed comment; with ``dry_run`` nothing is written.
+    """
+    changed, unchanged, version = [], [], None
+    read = {}  # pk -> (status, updated_at) as scored
+    for (pk, post_id, author_id, status, label, updated_at, _), (is_toxic, new_label, version) in zip(rows, verdicts):
+        read[pk] = (status, updated_at)
+        target = rescore_target(status, label, is_toxic, new_label)
+        if target is None or target == (status, label):
+            unchanged.append(pk)
+        else:
+            changed.append((pk, post_id, author_id, status, label) + target)
+    if dry_run or not rows:
+        return [(pk, old, new, old_label, new_label) for pk, _, _, old, old_label, new, new_label in changed]
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Skip rows deleted, edited or moderated by someone else while we were
+        # scoring: every save bumps updated_at, so the verdict for the old text
+        # is never written over a new one.
+        current = {
+            pk: (status, updated_at)
+            for pk, status, updated_at in Comment.objects.select_for_update()
+            .filter(pk__in=list(read)).values_list('pk', 'status', 'updated_at')
+        }
+        changed = [row for row in changed if current.get(row[0]) == read[row[0]]]
+        unchanged = [pk for pk in unchanged if current.get(pk) == read[pk]]
+        Comment.objects.bulk_update(
+            [
+                Comment(pk=pk, status=new, toxicity_label=new_label, model_version=version, updated_at=now)
+                for pk, _, _, _, _, new, new_label in changed
+            ],
+            ['status', 'toxicity_label', 'model_version', 'updated_at'],
+            batch_size=500,
+        )
+        Comment.objects.filter(pk__in=unchanged).update(model_version=version)
+        # bulk_update sends no signals: adjust the counters here.
+        statuses_changed((post_id, old, new, new_label) for _, post_id, _, old, _, new, new_label in changed)
+
+        flagged = [row for row in changed if row[3] != row[5] == 'pending_review']
+        titles = dict(Post.objects.filter(pk__in={row[1] for row in flagged}).values_list('pk', 'title'))
+        notifications = [
+            Notification(user_id=author_id, message=FLAGGED_MESSAGE.format(title=titles[post_id], label=new_label),
+                         comment_id=pk)
+            for pk, post_id, author_id, _, _, _, new_label in flagged
+        ]
+        Notification.objects.bulk_create(notifications, batch_size=500)
+        notifications_created(notifications)
+    if any(old != new for _, _, _, old, _, new, _ in changed):
+        invalidate_sidebar()
+    return [(pk, old, new, old_label, new_label) for pk, _, _, old, old_label, new, new_label in changed]
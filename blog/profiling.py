@@ -0,0 +1,98 @@
+"""
+Per-request timing collected by blog.middleware.RequestProfilerMiddleware.
+
+The middleware puts a RequestProfile in ``current_profile`` for sampled
+requests only. Instrumented code calls record(), which is a single
+ContextVar lookup when the request isn't being profiled.
+"""
+import heapq
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+current_profile = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sections = {}   # name -> total seconds
+        self.queries = []    # (seconds, sql)
+
+    def add(self, section, seconds):
+        self.sections[section] = self.sections.get(section, 0.0) + seconds
+
+    def add_query(self, seconds, sql):
+        self.queries.append((seconds, sql))
+
+    @property
+    def sql_seconds(self):
+        return sum(seconds for seconds, _ in self.queries)
+
+    def slowest_queries(self, n):
+        return heapq.nlargest(n, self.queries, key=lambda q: q[0])
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def record(section, seconds):
+    """Adds ``seconds`` to ``section`` of the current request's profile, if it is being profiled."""
+    profile = current_profile.get()
+    if profile is not None:
+        profile.add(section, seconds)
+
+
+def profile_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile = current_profile.get()
+        if profile is not None:
+            profile.add_query(time.perf_counter() - started, sql)
+
+
+_timer_lock = threading.Lock()
+_timer_users = 0
+_original_render = None
+
+
+def _timed_render(self, context=None, request=None):
+    if current_profile.get() is None:  # a concurrent, unsampled request
+        return _original_render(self, context, request)
+    started = time.perf_counter()
+    try:
+        return _original_render(self, context, request)
+    finally:
+        record('template', time.perf_counter() - started)
+
+
+@contextmanager
+def template_timer():
+    """
+    Times every top-level template render (render(), TemplateResponse) while
+    the block runs. Includes render through django.template.base.Template
+    and are part of their parent's time, so nothing is counted twice.
+
+    The wrapper around the backend's Template.render is installed when the
+    first profiled request starts and removed when the last one finishes, so
+    Django's own render runs untouched whenever nothing is being profiled.
+    """
+    global _timer_users, _original_render
+    from django.template.backends.django import Template
+
+    with _timer_lock:
+        if _timer_users == 0:
+            _original_render = Template.render
+            Template.render = _timed_render
+        _timer_users += 1
+    try:
+        yield
+    finally:
+        with _timer_lock:
+            _timer_users -= 1
+            if _timer_users == 0:
+                Template.render = _original_render
+                _original_render = None
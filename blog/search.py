@@ -0,0 +1,163 @@
+"""
+Full-text post search backed by an SQLite FTS5 table (blog_post_fts).
+
+The table holds each post's title and its content as plain text (HTML
+stripped), keyed by the post id as rowid. Migration 0014 creates and fills
+it; the post_save / post_delete receivers in blog/signals.py keep it in
+sync, and `manage.py rebuild_search_index` rebuilds it from scratch.
+
+On databases without FTS5 search_posts() falls back to the old
+title/content icontains scan.
+"""
+import html
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape, strip_tags
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+FTS_TABLE = 'blog_post_fts'
+
+# Weight of a title match relative to a body match in the bm25 ranking.
+TITLE_WEIGHT = 10.0
+SNIPPET_TOKENS = 32
+
+# Highlight markers that cannot occur in post text; they are swapped for
+# <mark> tags after the snippet has been HTML-escaped.
+_MARK_START, _MARK_END = '\x02', '\x03'
+_TERMS = re.compile(r'\w+')
+
+_fts_enabled = None
+
+
+def fts_enabled():
+    global _fts_enabled
+    if _fts_enabled is None:
+        _fts_enabled = connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+    return _fts_enabled
+
+
+def plain_text(content):
+    return html.unescape(strip_tags(content or ''))
+
+
+def index_post(post):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)',
+            [post.pk, post.title, plain_text(post.content)],
+        )
+
+
+def unindex_post(post_id):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+
+def rebuild_index(batch_size=500):
+    """Reindexes every post. Returns the number of posts indexed."""
+    indexed = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        rows = Post.objects.order_by('pk').values_list('pk', 'title', 'content')
+        batch = []
+        for pk, title, content in rows.iterator(chunk_size=batch_size):
+            batch.append((pk, title, plain_text(content)))
+            if len(batch) >= batch_size:
+                cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)', batch)
+                indexed += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)', batch)
+            indexed += len(batch)
+    return indexed
+
+
+def match_expression(query):
+    """
+    Turns free text into an FTS5 query: every word must match, as a prefix.
+    Each word is quoted, so FTS5 operators typed by users are taken literally.
+    """
+    return ' '.join(f'"{term}"*' for term in _TERMS.findall(query or ''))
+
+
+def _highlighted(text):
+    return mark_safe(escape(text).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>'))
+
+
+class PostSearch:
+    """
+    Ranked FTS5 results for ``query``, sliceable and countable so it can be
+    handed straight to django.core.paginator.Paginator. Each post in a slice
+    carries ``title_highlight`` and ``snippet`` (safe HTML with <mark> tags).
+    """
+
+    def __init__(self, query):
+        self.expression = match_expression(query)
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            if not self.expression:
+                self._count = 0
+            else:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [self.expression])
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, page):
+        if not isinstance(page, slice) or page.step is not None:
+            raise TypeError('PostSearch only supports plain slicing.')
+        start = page.start or 0
+        if not self.expression or (page.stop is not None and page.stop <= start):
+            return []
+        limit = -1 if page.stop is None else page.stop - start
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, highlight({FTS_TABLE}, 0, %s, %s), '
+                f'snippet({FTS_TABLE}, 1, %s, %s, %s, %s) '
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, %s, 1.0) LIMIT %s OFFSET %s',
+                [_MARK_START, _MARK_END, _MARK_START, _MARK_END, '…', SNIPPET_TOKENS,
+                 self.expression, TITLE_WEIGHT, limit, start],
+            )
+            hits = cursor.fetchall()
+        posts = Post.objects.select_related('author', 'genre').in_bulk([pk for pk, _, _ in hits])
+        results = []
+        for pk, title, snippet in hits:
+            post = posts.get(pk)
+            if post is None:  # deleted since it was indexed
+                continue
+            post.title_highlight = _highlighted(title)
+            post.snippet = _highlighted(snippet)
+            results.append(post)
+        return results
+
+
+def search_posts(query):
+    """Returns a paginatable result set for ``query``, ranked when FTS5 is available."""
+    if fts_enabled():
+        return PostSearch(query)
+    if not query:
+        return Post.objects.none()
+    return (
+        Post.objects.filter(Q(title__icontains=query) | Q(content__icontains=query))
+        .select_related('author', 'genre').order_by('-created_at')
+    )
+
+
+def scan_posts(query):
+    """The pre-FTS implementation (LIKE over title and HTML content), kept for benchmarking."""
+    return Post.objects.filter(Q(title__icontains=query) | Q(content__icontains=query)).distinct().order_by('-created_at')
@@ -0,0 +1,35 @@
+"""
+Cached sidebar blocks for the homepage (PostListView).
+
+The featured post, popular posts, recent comments and genre list change far
+less often than the homepage is viewed, so they are built once and kept in
+the default cache until a Post, Comment or Genre is saved or deleted (see
+blog/signals.py). Code that changes comments with QuerySet.update(), which
+sends no signals, calls invalidate_sidebar() itself.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Comment, Genre, Post
+
+SIDEBAR_CACHE_KEY = 'blog:sidebar'
+
+
+def build_sidebar():
+    """Runs the sidebar queries. Everything is evaluated so the result can be cached."""
+    return {
+        'featured_post': Post.objects.select_related('genre').order_by('-created_at').first(),
+        'popular_posts': list(Post.objects.order_by('-comment_count', '-created_at')[:5]),
+        'recent_comments': list(
+            Comment.objects.filter(status='approved').select_related('author', 'post').order_by('-created_at')[:5]
+        ),
+        'all_genres': list(Genre.objects.all()),
+    }
+
+
+def get_sidebar():
+    return cache.get_or_set(SIDEBAR_CACHE_KEY, build_sidebar, settings.SIDEBAR_CACHE_TIMEOUT)
+
+
+def invalidate_sidebar():
+    cache.delete(SIDEBAR_CACHE_KEY)
@@ -0,0 +1,73 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import counters, search, site_stats
+from .context_processors import invalidate_site_globals
+from .models import Comment, Genre, Notification, Post, SiteSettings
+from .sidebar import invalidate_sidebar
+
+
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=Genre)
+def sidebar_content_changed(sender, **kwargs):
+    invalidate_sidebar()
+
+
+@receiver([post_save, post_delete], sender=Genre)
+@receiver([post_save, post_delete], sender=SiteSettings)
+def site_globals_changed(sender, **kwargs):
+    invalidate_site_globals()
+
+
+@receiver([pre_save, pre_delete], sender=Comment)
+def comment_changing(sender, instance, raw=False, **kwargs):
+    if not raw:
+        counters.load_stored_status(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:  # fixtures carry their own counter values
+        counters.comment_saved(instance, created)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.comment_deleted(instance)
+
+
+@receiver(post_save, sender=Notification)
+def notification_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        counters.notification_saved(instance, created)
+
+
+@receiver(post_delete, sender=Notification)
+def notification_deleted(sender, instance, **kwargs):
+    counters.notification_deleted(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        search.index_post(instance)
+        counters.post_saved(instance, created)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+    counters.post_deleted(instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        site_stats.adjust_totals(user_count=1)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    site_stats.adjust_totals(user_count=-1)
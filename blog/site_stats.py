@@ -0,0 +1,129 @@
+"""
+Materialized statistics for the admin dashboard.
+
+SiteStats keeps the site-wide totals (posts, comments, users and comments
+awaiting moderation) in a single row, so the dashboard reads them with one
+primary-key lookup instead of COUNT(*)s over whole tables. HourlyStat counts
+events per hour: comments written ('comments') and comments sent to the
+moderation queue per toxicity label ('flagged:<label>'), which is what the
+dashboard's trends are drawn from.
+
+blog/counters.py and the receivers in blog/signals.py adjust both with
+atomic F() updates as things happen. `manage.py reconcile_site_stats`
+recomputes the totals and the comment buckets and prunes old buckets; flag
+buckets record events as they happened and can't be recomputed.
+"""
+from collections import Counter
+from datetime import timedelta, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Func, Subquery
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import Comment, HourlyStat, Post, SiteStats
+
+SITE_STATS_PK = 1
+COMMENTS = 'comments'
+FLAGGED = 'flagged:'
+
+
+def _hour(moment):
+    # Buckets are UTC hours, so they line up with TruncHour(..., tzinfo=UTC).
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def flag_metric(status, label):
+    """The bucket for a comment entering the moderation queue: user reports, or the classifier's label."""
+    return FLAGGED + ('user report' if status == 'reported' else label or 'unlabelled')
+
+
+def count_event(metric, n=1, at=None):
+    """Adds ``n`` to ``metric``'s bucket for the hour of ``at`` (default: now)."""
+    if not n:
+        return
+    hour = _hour(at or timezone.now())
+    bucket = HourlyStat.objects.filter(hour=hour, metric=metric)
+    if bucket.update(count=F('count') + n):
+        return
+    try:
+        with transaction.atomic():
+            HourlyStat.objects.create(hour=hour, metric=metric, count=n)
+    except IntegrityError:  # another request opened the bucket first
+        bucket.update(count=F('count') + n)
+
+
+def adjust_totals(**deltas):
+    """Adds to the SiteStats totals, e.g. adjust_totals(comment_count=1)."""
+    fields = {name: F(name) + delta for name, delta in deltas.items() if delta}
+    if fields and not SiteStats.objects.filter(pk=SITE_STATS_PK).update(**fields):
+        rebuild_totals()  # first use: count everything, this change included
+
+
+def _count(queryset):
+    return Subquery(queryset.order_by().annotate(n=Func(F('pk'), function='COUNT')).values('n'))
+
+
+def rebuild_totals():
+    """Recounts the SiteStats totals inside the UPDATE itself."""
+    SiteStats.objects.get_or_create(pk=SITE_STATS_PK)
+    SiteStats.objects.filter(pk=SITE_STATS_PK).update(
+        post_count=_count(Post.objects.all()),
+        comment_count=_count(Comment.objects.all()),
+        user_count=_count(User.objects.all()),
+        moderation_count=_count(Comment.objects.filter(status__in=Comment.MODERATION_STATUSES)),
+    )
+
+
+def rebuild_comment_buckets(days):
+    """Recomputes the 'comments' buckets of the last ``days`` days from Comment.created_at."""
+    since = _hour(timezone.now() - timedelta(days=days))
+    per_hour = (
+        Comment.objects.filter(created_at__gte=since).order_by()
+        .annotate(bucket=TruncHour('created_at', tzinfo=dt_timezone.utc)).values('bucket').annotate(n=Count('pk'))
+    )
+    with transaction.atomic():
+        HourlyStat.objects.filter(metric=COMMENTS, hour__gte=since).delete()
+        HourlyStat.objects.bulk_create(
+            HourlyStat(hour=row['bucket'], metric=COMMENTS, count=row['n']) for row in per_hour
+        )
+
+
+def prune_buckets(keep_days):
+    """Deletes buckets older than ``keep_days`` days. Returns the number deleted."""
+    deleted, _ = HourlyStat.objects.filter(hour__lt=_hour(timezone.now() - timedelta(days=keep_days))).delete()
+    return deleted
+
+
+def get_site_stats():
+    stats = SiteStats.objects.filter(pk=SITE_STATS_PK).first()
+    if stats is None:
+        rebuild_totals()
+        stats = SiteStats.objects.get(pk=SITE_STATS_PK)
+    return stats
+
+
+def hourly_trends(hours=24):
+    """
+    Comments per hour (oldest first, with the bar height as a percentage of
+    the busiest hour) and flags per label over the last ``hours`` hours.
+    """
+    end = _hour(timezone.now())
+    start = end - timedelta(hours=hours - 1)
+    comments = {start + timedelta(hours=i): 0 for i in range(hours)}
+    flags = Counter()
+    for hour, metric, count in HourlyStat.objects.filter(hour__gte=start).values_list('hour', 'metric', 'count'):
+        if metric == COMMENTS:
+            if hour in comments:
+                comments[hour] = count
+        elif metric.startswith(FLAGGED):
+            flags[metric[len(FLAGGED):]] += count
+
+    busiest = max(comments.values()) or 1
+    return {
+        'hours': [{'hour': hour, 'count': count, 'percent': round(100 * count / busiest)} for hour, count in comments.items()],
+        'comments': sum(comments.values()),
+        'flags': flags.most_common(),
+        'flagged': sum(flags.values()),
+    }
@@ -1,3 +1,1544 @@
-from django.test import TestCase
+import csv
+import json
+import logging
+import os
+import pickle
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.db import connection
+from django.template.backends.django import Template as DjangoTemplate
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import ai_toxicity, moderation
+from . import urls as blog_urls
+from .ai_toxicity import LEGACY_MODEL_PATH, ToxicityClassifier, VerdictCache, get_toxicity_classifier
+from .classifier_metrics import classifier_metrics
+from .context_processors import invalidate_site_globals
+from .counters import approve_queryset, drifted_posts, get_or_create_profile, notifications_created, unread_notification_count
+from .middleware import RequestProfilerMiddleware
+from .model_artifacts import MANIFEST_FILE, load_artifacts, publish_artifacts, read_manifest, save_artifacts
+from .models import AuthorStats, Comment, Genre, HourlyStat, Notification, Post, Profile, SiteSettings, SiteStats
+from .moderation import (
+    PENDING_CLASSIFICATION, apply_rescore, approve_comments, iter_rescore_chunks, process_pending_batch, reject_comments,
+    score_rows,
+)
+from .sidebar import SIDEBAR_CACHE_KEY
+from .site_stats import get_site_stats, hourly_trends
+from .text_processing import STOP_WORDS, Tokenizer, preprocess
+from .training import iter_chunks, train
+
+DATASET_PATH = os.path.join(os.path.dirname(__file__), 'balanced_3class_toxic_dataset.csv')
+
+# settings.CACHES is a file cache shared with the running server; tests get a
+# private in-process one so they can neither see nor delete live cache keys.
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Model load timings are logged at INFO to the tracked debug.log; tests detach
+# that handler (assertLogs still sees the records).
+CLASSIFIER_LOG = logging.getLogger('blog.classifier')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BlogSimpleTestCase(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cache.clear()
+        cls.enterClassContext(mock.patch.object(CLASSIFIER_LOG, 'handlers', []))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BlogTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cache.clear()
+        cls.enterClassContext(mock.patch.object(CLASSIFIER_LOG, 'handlers', []))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BlogTransactionTestCase(TransactionTestCase):
+    """For tests that need several database connections to see each other's commits."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cache.clear()
+        cls.enterClassContext(mock.patch.object(CLASSIFIER_LOG, 'handlers', []))
+
+
+class TestCacheIsolationTests(BlogSimpleTestCase):
+    def test_tests_use_a_private_cache(self):
+        self.assertEqual(settings.CACHES, TEST_CACHES)
+        self.assertIsInstance(caches['default'], LocMemCache)
+
+    def test_tests_keep_classifier_timings_out_of_debug_log(self):
+        self.assertEqual(CLASSIFIER_LOG.handlers, [])
+
+    def test_every_test_class_gets_the_private_cache(self):
+        for base in (SimpleTestCase, TransactionTestCase, TestCase):
+            for test_class in base.__subclasses__():
+                if test_class.__module__ != __name__:
+                    continue
+                self.assertTrue(
+                    issubclass(test_class, (BlogSimpleTestCase, BlogTransactionTestCase, BlogTestCase)),
+                    msg=test_class.__name__,
+                )
+
+
+class TokenizerParityTests(BlogSimpleTestCase):
+    """The fast Tokenizer must produce exactly the tokens the model was trained on."""
+
+    EDGE_CASES = [
+        '',
+        '   ',
+        'Hello, World!!!',
+        "Don't you DARE say that again...",
+        'tabs\tand\nnewlines\r\nand\x0bvertical\x0cfeeds\x1cand\x1funit seps',
+        'digits 123 and mixed l33t sp34k',
+        'Ünïcödé wörds, naïve café, and 中文 text',
+        'İstanbul ǅemal ﬁne',  # lowercasing can introduce ASCII letters
+        'non breaking spaces here',
+        'running quickly jumped cats buses es ly ing',
+        'a ' * 50 + 'the end',
+    ]
+
+    def assertParity(self, tokenizer, texts):
+        for text in texts:
+            self.assertEqual(tokenizer(text), preprocess(text), msg=repr(text))
+
+    def test_edge_cases(self):
+        self.assertParity(Tokenizer(), self.EDGE_CASES)
+
+    def test_dataset(self):
+        with open(DATASET_PATH, encoding='utf-8') as f:
+            texts = [row['comment_text'] for row in csv.DictReader(f)]
+        tokenizer = Tokenizer()
+        # Twice, so the second pass exercises the memoized stem table.
+        self.assertParity(tokenizer, texts)
+        self.assertParity(tokenizer, texts)
+
+    def test_stem_table_is_bounded(self):
+        tokenizer = Tokenizer(max_stems=3)
+        tokens = tokenizer('alpha betas gammas deltas epsilons')
+        self.assertEqual(tokens, preprocess('alpha betas gammas deltas epsilons'))
+        self.assertEqual(len(tokenizer._stems), 3)
+
+    def test_classifier_uses_same_tokens(self):
+        classifier = ToxicityClassifier()
+        self.assertTrue(classifier.model_loaded)
+        self.assertEqual(set(classifier.stop_words), set(STOP_WORDS))
+        for text in self.EDGE_CASES:
+            self.assertEqual(classifier.preprocess(text), preprocess(text, classifier.stop_words))
+
+
+def reference_probabilities(classifier, text):
+    """Class probabilities from the original per-token scoring loop, for parity checks."""
+    scores = {c: classifier.priors[c] for c in classifier.classes}
+    for word in classifier.preprocess(text):
+        index = classifier.word2idx.get(word)
+        for c in classifier.classes:
+            if index is not None:
+                scores[c] += classifier.likelihoods[c][index]
+            else:
+                scores[c] += np.log(classifier.alpha / classifier.total_words_per_class[c])
+    scores = np.array([scores[c] for c in classifier.classes])
+    exp_scores = np.exp(scores - scores.max())
+    return exp_scores / exp_scores.sum()
+
+
+def reference_verdict(classifier, probabilities):
+    toxic = {c: p for c, p in zip(classifier.classes, probabilities) if c != classifier.NON_TOXIC_LABEL}
+    if sum(toxic.values()) > classifier.TOXICITY_THRESHOLD:
+        return True, max(toxic, key=toxic.get)
+    return False, 'clean'
+
+
+class ClassifierScoringTests(BlogSimpleTestCase):
+    """The vectorized scoring must agree with the original per-token loop."""
+
+    EDGE_CASES = [
+        '',                                    # no tokens at all
+        'the and of to is a',                  # stop words only
+        'qwertyuiop asdfghjkl zxcvbnmzz',      # every token out of vocabulary
+        'you are a stupid idiot moron',
+        'thanks for sharing this, really helpful',
+        'idiot qwertyuiop idiot',              # known and unknown words mixed
+    ]
+
+    def classifiers(self):
+        # Both storage formats: the legacy pickle (dict vocabulary) and the
+        # memory-mapped model root (MappedVocabulary).
+        return [ToxicityClassifier(LEGACY_MODEL_PATH, cache_size=0), ToxicityClassifier(cache_size=0)]
+
+    def dataset_texts(self, limit=500):
+        with open(DATASET_PATH, encoding='utf-8') as f:
+            return [row['comment_text'] for _, row in zip(range(limit), csv.DictReader(f))]
+
+    def assertMatchesReference(self, classifier, texts):
+        _, probabilities = classifier.predict_many(texts)
+        for text, row in zip(texts, probabilities):
+            expected = reference_probabilities(classifier, text)
+            np.testing.assert_allclose(row, expected, rtol=1e-9, atol=1e-12, err_msg=repr(text))
+            self.assertEqual(classifier.predict(text), reference_verdict(classifier, expected), msg=repr(text))
+
+    def test_edge_cases(self):
+        for classifier in self.classifiers():
+            self.assertTrue(classifier.model_loaded)
+            self.assertMatchesReference(classifier, self.EDGE_CASES)
+
+    def test_empty_and_stop_word_text_score_the_priors(self):
+        for classifier in self.classifiers():
+            priors = np.array([classifier.priors[c] for c in classifier.classes])
+            expected = np.exp(priors - priors.max()) / np.exp(priors - priors.max()).sum()
+            for text in ('', 'the and of to is a'):
+                self.assertEqual(classifier.preprocess(text), [])
+                np.testing.assert_allclose(classifier.predict_many([text])[1][0], expected)
+
+    def test_dataset(self):
+        for classifier in self.classifiers():
+            self.assertMatchesReference(classifier, self.dataset_texts())
+
+    def test_predict_many_matches_predict_around_empty_texts(self):
+        toxic, clean = self.EDGE_CASES[3], self.EDGE_CASES[4]
+        batches = [
+            ['', toxic, clean],                 # empty first
+            [toxic, '', clean],                 # empty in the middle
+            [toxic, clean, ''],                 # empty last
+            [toxic, '', '', 'the and', clean],  # a run of texts without tokens
+            ['', 'the and of'],                 # nothing but empty texts
+            [''],
+        ]
+        for classifier in self.classifiers():
+            for texts in batches:
+                verdicts, probabilities = classifier.predict_many(texts)
+                self.assertEqual(verdicts, [classifier.predict(t) for t in texts], msg=texts)
+                for text, row in zip(texts, probabilities):
+                    np.testing.assert_allclose(row, reference_probabilities(classifier, text), err_msg=repr(text))
+            verdicts, probabilities = classifier.predict_many([])
+            self.assertEqual((verdicts, probabilities.shape), ([], (0, len(classifier.classes))))
+
+    def test_predict_many_matches_predict_on_the_dataset(self):
+        texts = self.dataset_texts(2000)
+        for classifier in self.classifiers():
+            self.assertEqual(classifier.predict_many(texts)[0], [classifier.predict(t) for t in texts])
+
+
+@override_settings(TOXICITY_ASYNC_MODERATION=True)
+class AsyncModerationTests(BlogTestCase):
+    TOXIC_TEXT = 'you are a stupid idiot moron'
+    CLEAN_TEXT = 'thanks for sharing this, really helpful'
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='pass12345')
+        self.post = Post.objects.create(title='Hello', content='<p>Body</p>', author=self.user)
+        self.client.force_login(self.user)
+
+    def test_add_comment_saves_without_classifying(self):
+        self.client.post(reverse('add_comment', args=[self.post.pk]), {'text': self.TOXIC_TEXT})
+        comment = Comment.objects.get()
+        self.assertEqual(comment.status, PENDING_CLASSIFICATION)
+        self.assertIsNone(comment.toxicity_label)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_batch_applies_approve_and_flag_logic(self):
+        for text in (self.TOXIC_TEXT, self.CLEAN_TEXT):
+            self.client.post(reverse('add_comment', args=[self.post.pk]), {'text': text})
+
+        self.assertEqual(process_pending_batch(), {'approved': 1, 'flagged': 1})
+        toxic = Comment.objects.get(text=self.TOXIC_TEXT)
+        self.assertEqual(toxic.status, 'pending_review')
+        self.assertEqual(toxic.toxicity_label, ToxicityClassifier().predict(self.TOXIC_TEXT)[1])
+        self.assertEqual(Comment.objects.get(text=self.CLEAN_TEXT).status, 'approved')
+        self.assertEqual(Notification.objects.get().comment, toxic)
+        self.assertEqual(toxic.model_version, get_toxicity_classifier().version)
+
+        # Nothing left to do on the next pass.
+        self.assertEqual(process_pending_batch(), {'approved': 0, 'flagged': 0})
+
+    def test_rows_taken_while_scoring_are_applied_once(self):
+        for text in (self.TOXIC_TEXT, self.CLEAN_TEXT, self.TOXIC_TEXT):
+            self.client.post(reverse('add_comment', args=[self.post.pk]), {'text': text})
+        first, second, third = Comment.objects.order_by('pk')
+        real_classify = moderation.classify_texts
+
+        def classify_while_others_move(texts, pool=None):
+            # While this worker scores: a moderator approves the first comment,
+            # someone deletes the third, and a second worker handles the rest.
+            approve_comments(Comment.objects.filter(pk=first.pk))
+            third.delete()
+            with mock.patch.object(moderation, 'classify_texts', real_classify):
+                self.assertEqual(process_pending_batch(), {'approved': 1, 'flagged': 0})
+            return real_classify(texts, pool)
+
+        with mock.patch.object(moderation, 'classify_texts', classify_while_others_move):
+            self.assertEqual(process_pending_batch(), {'approved': 0, 'flagged': 0})
+
+        self.assertEqual(dict(Comment.objects.values_list('pk', 'status')), {first.pk: 'approved', second.pk: 'approved'})
+        self.assertEqual(Notification.objects.count(), 1)  # the moderator's approval only
+        self.assertEqual(list(drifted_posts()), [])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.approved_comment_count, 2)
+        self.assertEqual(get_site_stats().moderation_count, 0)
+
+
+    def test_batch_is_rolled_back_when_an_update_misses_a_claimed_row(self):
+        for text in (self.TOXIC_TEXT, self.CLEAN_TEXT):
+            self.client.post(reverse('add_comment', args=[self.post.pk]), {'text': text})
+        toxic = Comment.objects.get(text=self.TOXIC_TEXT)
+        interfered = []
+
+        def move_a_row_once(execute, sql, params, many, context):
+            # On the first attempt only, the flagged comment stops being
+            # pending between the claim and the UPDATE.
+            if not interfered and sql.startswith('UPDATE "blog_comment"'):
+                interfered.append(sql)
+                Comment.objects.filter(pk=toxic.pk).update(status='approved')
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(move_a_row_once):
+            self.assertEqual(process_pending_batch(), {'approved': 1, 'flagged': 1})
+        self.assertTrue(interfered)
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(list(drifted_posts()), [])
+
+class ConcurrentModerationWorkerTests(BlogTransactionTestCase):
+    def test_overlapping_workers_apply_each_comment_once(self):
+        user = User.objects.create_user('reader', password='pass12345')
+        post = Post.objects.create(title='Hello', content='<p>Body</p>', author=user)
+        for text in (AsyncModerationTests.TOXIC_TEXT, AsyncModerationTests.CLEAN_TEXT):
+            Comment.objects.create(post=post, author=user, text=text, status=PENDING_CLASSIFICATION)
+
+        written = threading.Event()
+        out, err = StringIO(), StringIO()
+        real_statuses_changed = moderation.statuses_changed
+
+        def second_worker():
+            written.wait()
+            try:
+                call_command('moderate_comments', '--once', '--poll-interval', '0.05', stdout=out, stderr=err)
+            finally:
+                connection.close()
+
+        def hold_the_transaction(changes):
+            # The first worker has written its UPDATEs; keep its transaction
+            # open while the second worker polls on its own connection.
+            written.set()
+            time.sleep(0.3)
+            return real_statuses_changed(changes)
+
+        worker = threading.Thread(target=second_worker)
+        worker.start()
+        with mock.patch.object(moderation, 'statuses_changed', hold_the_transaction):
+            self.assertEqual(process_pending_batch(), {'approved': 1, 'flagged': 1})
+        worker.join()
+
+        # The second worker either waited for the lock or retried after
+        # "database is locked"; either way it found nothing left to apply.
+        self.assertNotIn('Approved', out.getvalue())
+        self.assertIn('Moderation worker stopped.', out.getvalue())
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(list(drifted_posts()), [])
+        post.refresh_from_db()
+        self.assertEqual(post.approved_comment_count, 1)
+        self.assertEqual(get_site_stats().moderation_count, 1)
+
+
+class ModelArtifactTests(BlogSimpleTestCase):
+    # Sorted, with several words sharing the 16-byte prefix the lookup searches on.
+    VOCAB = [
+        'abcdefghijklmnop', 'abcdefghijklmnopq', 'abcdefghijklmnopqrst', 'abcdefghijklmnopz',
+        'café', 'cat', 'zebra',
+    ]
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def tiny_artifacts(self):
+        n = len(self.VOCAB)
+        return {
+            'classes': ['non-toxic', 'toxic'],
+            'priors': {'non-toxic': np.log(0.6), 'toxic': np.log(0.4)},
+            'likelihoods': {'non-toxic': np.linspace(-9, -8, n), 'toxic': np.linspace(-8, -9, n)},
+            'word2idx': {w: i for i, w in enumerate(self.VOCAB)},
+            'total_words_per_class': {'non-toxic': 100, 'toxic': 80},
+            'alpha': 1.0,
+            'stop_words': {'the'},
+        }
+
+    def test_pickle_round_trip_predicts_identically(self):
+        with open(LEGACY_MODEL_PATH, 'rb') as f:
+            artifacts = pickle.load(f)
+        directory = os.path.join(self.root, 'v1')
+        save_artifacts(artifacts, directory)
+        loaded = load_artifacts(directory)
+        self.assertEqual(loaded['classes'], list(artifacts['classes']))
+        self.assertEqual(len(loaded['word2idx']), len(artifacts['word2idx']))
+
+        legacy = ToxicityClassifier(LEGACY_MODEL_PATH, cache_size=0)
+        mapped = ToxicityClassifier(directory, cache_size=0)
+        self.assertEqual(mapped.version, 'v1')
+        with open(DATASET_PATH, encoding='utf-8') as f:
+            texts = [row['comment_text'] for _, row in zip(range(1000), csv.DictReader(f))]
+        texts += ClassifierScoringTests.EDGE_CASES
+        self.assertEqual(mapped.predict_many(texts)[0], legacy.predict_many(texts)[0])
+        np.testing.assert_allclose(mapped.predict_many(texts)[1], legacy.predict_many(texts)[1])
+
+    def test_mapped_vocabulary_hits_and_misses(self):
+        directory = os.path.join(self.root, 'tiny')
+        save_artifacts(self.tiny_artifacts(), directory)
+        vocab = load_artifacts(directory)['word2idx']
+        self.assertEqual(len(vocab), len(self.VOCAB))
+        for index, word in enumerate(self.VOCAB):
+            self.assertEqual(vocab.get(word), index, msg=word)
+            self.assertEqual(vocab.word(index), word)
+        # Misses, including words sharing a full 16-byte prefix with vocabulary words.
+        for word in ('', 'abcdefghijklmno', 'abcdefghijklmnopqr', 'abcdefghijklmnopy', 'cafe', 'dog', 'zzz'):
+            self.assertNotIn(word, vocab, msg=word)
+            self.assertEqual(vocab.get(word, -1), -1)
+        tokens = ['cat', 'abcdefghijklmnopqr', 'abcdefghijklmnopz', 'dog', 'abcdefghijklmnop']
+        self.assertEqual(vocab.indices(tokens, -1).tolist(), [5, -1, 3, -1, 0])
+        self.assertEqual(vocab.indices([], -1).tolist(), [])
+
+    def test_save_rejects_an_unsorted_vocabulary(self):
+        artifacts = self.tiny_artifacts()
+        artifacts['word2idx'] = {w: i for i, w in enumerate(reversed(self.VOCAB))}
+        with self.assertRaises(ValueError):
+            save_artifacts(artifacts, os.path.join(self.root, 'bad'))
+
+    def test_publish_writes_the_manifest(self):
+        self.assertIsNone(read_manifest(self.root))
+        publish_artifacts(self.tiny_artifacts(), self.root, version='v1')
+        publish_artifacts(self.tiny_artifacts(), self.root, version='v2')
+        manifest = read_manifest(self.root)
+        self.assertTrue(os.path.exists(os.path.join(self.root, MANIFEST_FILE)))
+        self.assertEqual(manifest['current'], 'v2')
+        self.assertEqual([v['version'] for v in manifest['versions']], ['v1', 'v2'])
+        self.assertEqual(manifest['versions'][0]['vocab_size'], len(self.VOCAB))
+        self.assertEqual(ToxicityClassifier(self.root, cache_size=0).version, 'v2')
+        with self.assertRaises(ValueError):
+            publish_artifacts(self.tiny_artifacts(), self.root, version='v2')
+
+    def test_convert_command_publishes_the_pickle(self):
+        out = StringIO()
+        call_command('convert_toxicity_model', '--output', self.root, '--model-version', 'converted', stdout=out)
+        self.assertIn('converted', out.getvalue())
+        self.assertEqual(read_manifest(self.root)['current'], 'converted')
+        converted = ToxicityClassifier(self.root, cache_size=0)
+        legacy = ToxicityClassifier(LEGACY_MODEL_PATH, cache_size=0)
+        texts = ClassifierScoringTests.EDGE_CASES
+        self.assertEqual(converted.predict_many(texts)[0], legacy.predict_many(texts)[0])
+
+
+class VerdictCacheTests(BlogSimpleTestCase):
+    def test_evicts_least_recently_used_at_capacity(self):
+        cache = VerdictCache(2)
+        cache.put('a', (False, 'clean'))
+        cache.put('b', (True, 'toxic'))
+        self.assertEqual(cache.get('a'), (False, 'clean'))  # 'a' is now the most recent
+        cache.put('c', (True, 'highly-toxic'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), (False, 'clean'))
+        self.assertEqual(cache.get('c'), (True, 'highly-toxic'))
+        cache.put('a', (True, 'toxic'))  # overwriting doesn't evict
+        self.assertEqual(cache.stats(), {'size': 2, 'maxsize': 2, 'hits': 3, 'misses': 1, 'evictions': 1})
+
+    def test_zero_size_disables_the_cache(self):
+        cache = VerdictCache(0)
+        cache.put('a', (False, 'clean'))
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['size'], 0)
+        self.assertEqual(cache.stats()['evictions'], 0)
+
+        classifier = ToxicityClassifier(cache_size=0)
+        self.assertIsNone(classifier.cache)
+        self.assertEqual(classifier.predict('you are a stupid idiot moron'), classifier.predict('you are a stupid idiot moron'))
+
+    def test_classifier_counts_hits_for_equivalent_texts(self):
+        classifier = ToxicityClassifier(cache_size=8)
+        first = classifier.predict('You are a stupid idiot!')
+        self.assertEqual(classifier.predict('you are STUPID, idiot'), first)  # same tokens
+        classifier.predict('thanks for sharing')
+        self.assertEqual(classifier.cache.stats(), {'size': 2, 'maxsize': 8, 'hits': 1, 'misses': 2, 'evictions': 0})
+
+    def test_key_covers_the_model_version(self):
+        tokens = ['stupid', 'idiot']
+        self.assertNotEqual(VerdictCache.key_for(tokens, 'v1'), VerdictCache.key_for(tokens, 'v2'))
+        self.assertNotEqual(VerdictCache.key_for([], 'v1'), VerdictCache.key_for(['v1']))
+        self.assertEqual(VerdictCache.key_for(tokens, 'v1'), VerdictCache.key_for(list(tokens), 'v1'))
+
+        # Even a cache shared across a reload doesn't serve the old model's verdict.
+        classifier = ToxicityClassifier(cache_size=8)
+        classifier.cache.put(VerdictCache.key_for(classifier.preprocess('hello there'), 'old-version'), (True, 'stale'))
+        self.assertEqual(classifier.predict('hello there'), (False, 'clean'))
+
+
+class LazyClassifierLoadingTests(BlogSimpleTestCase):
+    def setUp(self):
+        # Start every test from an unloaded singleton.
+        for patcher in (
+            mock.patch.object(ai_toxicity, '_classifier', None),
+            mock.patch.object(ai_toxicity, '_last_version_check', 0.0),
+            mock.patch.dict(ai_toxicity.load_timings, clear=True),
+            mock.patch.object(ai_toxicity, 'ToxicityClassifier', wraps=ToxicityClassifier),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_import_loads_nothing(self):
+        # A fresh interpreter: this one has long since imported the module.
+        script = (
+            "import django; django.setup()\n"
+            "from blog import ai_toxicity\n"
+            "print(ai_toxicity._classifier is None, ai_toxicity.load_timings == {})\n"
+        )
+        env = {k: v for k, v in os.environ.items() if k != 'TOXICITY_PRELOAD'}
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'toxicity_blog.settings')
+        result = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        self.assertEqual(result.stdout.split(), ['True', 'True'])
+
+    def test_first_use_loads_exactly_once(self):
+        self.assertEqual(ai_toxicity.ToxicityClassifier.call_count, 0)
+        threads = [threading.Thread(target=get_toxicity_classifier) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        classifier = get_toxicity_classifier()
+        self.assertIs(ai_toxicity.toxicity_classifier.cache, classifier.cache)  # the proxy reuses it too
+        self.assertEqual(ai_toxicity.ToxicityClassifier.call_count, 1)
+        self.assertEqual(ai_toxicity.load_timings['mode'], 'cold')
+        self.assertEqual(ai_toxicity.load_timings['version'], classifier.version)
+
+    @override_settings(TOXICITY_PRELOAD=False)
+    def test_startup_skips_warm_up_without_preload(self):
+        apps.get_app_config('blog').ready()
+        self.assertIsNone(ai_toxicity._classifier)
+        self.assertEqual(ai_toxicity.ToxicityClassifier.call_count, 0)
+        self.assertEqual(ai_toxicity.load_timings, {})
+
+    @override_settings(TOXICITY_PRELOAD=True)
+    def test_startup_warm_up_fills_load_timings(self):
+        apps.get_app_config('blog').ready()
+        self.assertIsNotNone(ai_toxicity._classifier)
+        timings = ai_toxicity.load_timings
+        self.assertEqual(timings['mode'], 'warm')
+        self.assertTrue(timings['model_loaded'])
+        self.assertEqual(timings['version'], ai_toxicity._classifier.version)
+        self.assertGreater(timings['load_ms'], 0)
+        self.assertGreater(timings['first_predict_ms'], 0)
+        # Already loaded: later requests and warm-ups don't load again.
+        get_toxicity_classifier()
+        ai_toxicity.warm_up()
+        self.assertEqual(ai_toxicity.ToxicityClassifier.call_count, 1)
+
+    def test_load_timings_are_logged_at_info(self):
+        with self.assertLogs('blog.classifier', 'INFO') as logs:
+            get_toxicity_classifier()
+            ai_toxicity.warm_up()
+        self.assertEqual([r.levelno for r in logs.records], [logging.INFO, logging.INFO])
+        self.assertIn('(cold start)', logs.records[0].getMessage())
+        self.assertIn('first prediction', logs.records[1].getMessage())
+        # ...and settings.LOGGING sends them to a handler that keeps INFO.
+        config = settings.LOGGING
+        handlers = config['loggers']['blog.classifier']['handlers']
+        self.assertEqual(config['loggers']['blog.classifier']['level'], 'INFO')
+        self.assertTrue(all(config['handlers'][name]['level'] == 'INFO' for name in handlers))
+
+
+class ModelHotReloadTests(BlogSimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        with open(LEGACY_MODEL_PATH, 'rb') as f:
+            self.artifacts = pickle.load(f)
+        publish_artifacts(self.artifacts, self.root, version='v1')
+
+        # Start every test from an unloaded singleton pointed at the temp root.
+        for name, value in (('MODEL_ROOT', self.root), ('_classifier', None), ('_last_version_check', 0.0)):
+            patcher = mock.patch.object(ai_toxicity, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @override_settings(TOXICITY_RELOAD_INTERVAL=0.01)
+    def test_new_version_is_swapped_in(self):
+        old = get_toxicity_classifier()
+        self.assertEqual(old.version, 'v1')
+
+        publish_artifacts(self.artifacts, self.root, version='v2')
+        time.sleep(0.02)
+        # The request that notices the new version still gets the old model.
+        self.assertIs(get_toxicity_classifier(), old)
+
+        deadline = time.monotonic() + 5
+        while ai_toxicity._classifier is old and time.monotonic() < deadline:
+            time.sleep(0.01)
+        new = get_toxicity_classifier()
+        self.assertEqual(new.version, 'v2')
+        self.assertIsNot(new.cache, old.cache)
+        self.assertEqual(ai_toxicity.toxicity_classifier.version, 'v2')
+
+    @override_settings(TOXICITY_RELOAD_INTERVAL=0)
+    def test_reload_can_be_disabled(self):
+        old = get_toxicity_classifier()
+        publish_artifacts(self.artifacts, self.root, version='v2')
+        self.assertIs(get_toxicity_classifier(), old)
+
+    @override_settings(TOXICITY_RELOAD_INTERVAL=0.01)
+    def test_unreadable_manifest_keeps_the_current_model(self):
+        old = get_toxicity_classifier()
+        manifest_path = os.path.join(self.root, MANIFEST_FILE)
+        for content in ('{"current": "v2", "vers', '["not", "a", "manifest"]'):
+            with open(manifest_path, 'w') as f:
+                f.write(content)
+            time.sleep(0.02)
+            with self.assertLogs('blog.ai_toxicity', 'ERROR'):
+                self.assertIs(get_toxicity_classifier(), old)
+        self.assertFalse(ai_toxicity._reloading)
+
+
+class ClassifierMetricsTests(BlogTestCase):
+    def setUp(self):
+        classifier_metrics.reset()
+        self.admin = User.objects.create_superuser('admin', password='pass12345')
+        self.user = User.objects.create_user('reader', password='pass12345')
+
+    def test_predictions_are_recorded(self):
+        classifier = ToxicityClassifier()
+        classifier.predict('you are a stupid idiot moron')
+        classifier.predict('You are a STUPID idiot moron!')  # cache hit
+        classifier.predict('qwertyuiop asdfghjkl')
+
+        snapshot = classifier_metrics.snapshot()
+        self.assertEqual(snapshot['predictions'], 3)
+        self.assertEqual(snapshot['cache_hits'], 1)
+        self.assertEqual(sum(snapshot['labels'].values()), 3)
+        self.assertEqual(snapshot['margin']['count'], 2)
+        self.assertGreater(snapshot['oov_rate'], 0)
+
+    def test_dashboard_requires_superuser(self):
+        self.client.force_login(self.user)
+        self.assertRedirects(self.client.get(reverse('classifier_metrics')), reverse('post_list'))
+        self.client.force_login(self.admin)
+        self.assertContains(self.client.get(reverse('classifier_metrics')), 'Classifier Metrics')
+
+    @override_settings(TOXICITY_METRICS_TOKEN='s3cret')
+    def test_prometheus_endpoint(self):
+        url = reverse('classifier_metrics_prometheus')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+        get_toxicity_classifier().predict('hello there friend')
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('toxicity_predict_seconds_bucket{le="+Inf"} 1', body)
+        self.assertIn('toxicity_model_info{version=', body)
+
+
+class StreamingTrainingTests(BlogSimpleTestCase):
+    ROWS = [
+        ('You are a stupid idiot', 'toxic'),
+        ('I will hurt you, you worthless idiot', 'highly-toxic'),
+        ('Thanks for the helpful post', 'non-toxic'),
+        ('Great writing, thanks', 'non-toxic'),
+        ('What an idiotic take', 'toxic'),
+    ] * 4
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.csv')
+        self.addCleanup(os.remove, self.path)
+        with os.fdopen(handle, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['comment_text', 'label'])
+            writer.writerows(self.ROWS)
+
+    def test_chunk_size_does_not_change_the_model(self):
+        small = train(iter_chunks(self.path, 3, 0.25, seed=7))
+        large = train(iter_chunks(self.path, 100, 0.25, seed=7))
+        self.assertEqual(small['word2idx'], large['word2idx'])
+        self.assertEqual(small['total_words_per_class'], large['total_words_per_class'])
+        for c in small['classes']:
+            self.assertTrue((small['likelihoods'][c] == large['likelihoods'][c]).all())
+
+    def test_artifacts_match_the_classifier_format(self):
+        artifacts = train(iter_chunks(self.path, 4, 0.0, seed=1))
+        self.assertEqual(artifacts['classes'], ['highly-toxic', 'non-toxic', 'toxic'])
+        self.assertEqual(list(artifacts['word2idx']), sorted(artifacts['word2idx']))
+        clean_tokens = sum(len(preprocess(text)) for text, label in self.ROWS if label == 'non-toxic')
+        self.assertEqual(artifacts['total_words_per_class']['non-toxic'], len(artifacts['word2idx']) + clean_tokens)
+
+
+class PostDetailCommentTreeTests(BlogTestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', password='pass12345')
+        self.reader = User.objects.create_user('reader', password='pass12345')
+        self.post = Post.objects.create(title='Thread', content='<p>Body</p>', author=self.author)
+
+    def add_thread(self, depth):
+        parent = None
+        for i in range(depth):
+            parent = Comment.objects.create(post=self.post, author=self.author, text=f'level {i}', parent=parent)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('post_detail', args=[self.post.pk]))
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_comments(self):
+        self.add_thread(3)
+        self.count_queries()  # warm the process-local site globals
+        baseline = self.count_queries()
+        for _ in range(5):
+            self.add_thread(4)
+        self.assertEqual(self.count_queries(), baseline)
+
+    def test_tree_keeps_visibility_rule(self):
+        root = Comment.objects.create(post=self.post, author=self.author, text='root')
+        Comment.objects.create(post=self.post, author=self.author, text='not-visible-to-reader', parent=root, status='pending_review')
+        own = Comment.objects.create(post=self.post, author=self.reader, text='own', parent=root, status='pending_review')
+        reply = Comment.objects.create(post=self.post, author=self.author, text='reply', parent=own)
+
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('post_detail', args=[self.post.pk]))
+        tree = response.context['comment_tree']
+        self.assertEqual(tree, [root])
+        self.assertEqual(tree[0].children, [own])
+        self.assertEqual(tree[0].children[0].children, [reply])
+        self.assertContains(response, 'Discussion (4)')
+        self.assertNotContains(response, 'not-visible-to-reader')
+
+
+class SidebarCacheTests(BlogTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pass12345')
+        self.post = Post.objects.create(title='Cached', content='<p>Body</p>', author=self.author, photo='post_photos/cached.jpg')
+
+    def test_warm_homepage_only_queries_posts(self):
+        self.client.get(reverse('post_list'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('post_list'))
+        self.assertEqual(response.context['featured_post'], self.post)
+        sql = [q['sql'] for q in queries]
+        self.assertFalse([s for s in sql if 'FROM "blog_comment"' in s or 'FROM "blog_genre"' in s], sql)
+        # Just the cursor page of posts (author and genre joined in); no COUNT.
+        self.assertEqual(len([s for s in sql if 'FROM "blog_post"' in s]), 1, sql)
+
+    def test_saving_a_comment_invalidates_the_sidebar(self):
+        self.client.get(reverse('post_list'))
+        self.assertIsNotNone(cache.get(SIDEBAR_CACHE_KEY))
+        comment = Comment.objects.create(post=self.post, author=self.author, text='fresh', status='approved')
+        self.assertIsNone(cache.get(SIDEBAR_CACHE_KEY))
+        response = self.client.get(reverse('post_list'))
+        self.assertEqual(response.context['recent_comments'], [comment])
+
+
+class CommentCounterTests(BlogTestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', password='pass12345')
+        self.admin = User.objects.create_superuser('admin', password='pass12345')
+        self.post = Post.objects.create(title='Counted', content='<p>Body</p>', author=self.author)
+
+    def assertCounts(self, total, approved):
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.comment_count, self.post.approved_comment_count), (total, approved))
+
+    def test_status_changes_and_deletes(self):
+        comment = Comment.objects.create(post=self.post, author=self.author, text='hi')
+        Comment.objects.create(post=self.post, author=self.author, text='held', status='pending_review')
+        self.assertCounts(2, 1)
+
+        self.client.force_login(self.author)
+        self.client.get(reverse('report_comment', args=[comment.pk]))
+        self.client.get(reverse('report_comment', args=[comment.pk]))
+        self.assertCounts(2, 0)
+
+        self.client.force_login(self.admin)
+        self.client.get(reverse('approve_comment', args=[comment.pk]))
+        self.assertCounts(2, 1)
+        self.client.get(reverse('delete_comment', args=[comment.pk]))
+        self.assertCounts(1, 0)
+
+    def test_cascades_and_bulk_approve(self):
+        root = Comment.objects.create(post=self.post, author=self.author, text='root')
+        reply = Comment.objects.create(post=self.post, author=self.author, text='reply', parent=root, status='reported')
+        Comment.objects.create(post=self.post, author=self.author, text='nested', parent=reply)
+        self.assertCounts(3, 2)
+
+        approve_queryset(Comment.objects.all())
+        self.assertCounts(3, 3)
+        root.delete()
+        self.assertCounts(0, 0)
+
+    def test_saves_without_a_known_status_dont_drift(self):
+        AuthorStats.objects.get_or_create(author=self.author)
+        approved = Comment.objects.create(post=self.post, author=self.author, text='fine')
+        flagged = Comment.objects.create(post=self.post, author=self.author, text='held', status='pending_review')
+        stats_before = get_site_stats().moderation_count
+
+        # Loaded with status deferred, then edited.
+        for pk in (approved.pk, flagged.pk):
+            deferred = Comment.objects.only('pk', 'text', 'post_id').get(pk=pk)
+            deferred.text += ' (edited)'
+            deferred.save()
+        # Built by hand for an existing row.
+        Comment(pk=approved.pk, post=self.post, author=self.author, text='rebuilt', status='approved').save()
+        self.assertCounts(2, 1)
+        self.assertEqual(list(drifted_posts()), [])
+        self.assertEqual(AuthorStats.objects.get(author=self.author).flagged_comments_received, 1)
+        self.assertEqual(get_site_stats().moderation_count, stats_before)
+
+        # A real status change through a deferred instance still counts.
+        deferred = Comment.objects.defer('status').get(pk=flagged.pk)
+        deferred.status = 'approved'
+        deferred.save()
+        self.assertCounts(2, 2)
+        Comment.objects.only('pk', 'post_id').get(pk=approved.pk).delete()
+        self.assertCounts(1, 1)
+        self.assertEqual(list(drifted_posts()), [])
+
+    def test_reconcile_command_fixes_drift(self):
+        Comment.objects.create(post=self.post, author=self.author, text='hi')
+        Post.objects.filter(pk=self.post.pk).update(comment_count=7, approved_comment_count=-2)
+
+        out = StringIO()
+        call_command('reconcile_comment_counts', '--dry-run', stdout=out)
+        self.assertIn('total 7 -> 1', out.getvalue())
+        self.assertCounts(7, -2)
+
+        call_command('reconcile_comment_counts', stdout=StringIO())
+        self.assertCounts(1, 1)
+
+
+class AuthorStatsTests(BlogTestCase):
+    FIELDS = ('post_count', 'comments_received', 'approved_comments_received', 'flagged_comments_received', 'first_post_at')
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', password='pass12345')
+        self.reader = User.objects.create_user('reader', password='pass12345')
+
+    def stats(self):
+        return AuthorStats.objects.filter(pk=self.author.pk).values_list(*self.FIELDS).get()
+
+    def assertMatchesRebuild(self):
+        maintained = self.stats()
+        call_command('rebuild_author_stats', stdout=StringIO())
+        self.assertEqual(maintained, self.stats())
+
+    def test_tracks_posts_comments_and_status_changes(self):
+        first = Post.objects.create(title='First', content='<p>Body</p>', author=self.author,
+                                    created_at=timezone.now() - timedelta(days=30))
+        second = Post.objects.create(title='Second', content='<p>Body</p>', author=self.author)
+        ok = Comment.objects.create(post=first, author=self.reader, text='great')
+        bad = Comment.objects.create(post=second, author=self.reader, text='meh', status='pending_review')
+        Comment.objects.create(post=second, author=self.reader, text='reply', parent=bad)
+        Comment.objects.create(post=second, author=self.reader, text='later', status=PENDING_CLASSIFICATION)
+        self.assertEqual(self.stats(), (2, 4, 2, 1, first.created_at))
+
+        ok.status = 'reported'
+        ok.save()
+        approve_queryset(Comment.objects.filter(pk=bad.pk))
+        self.assertEqual(self.stats()[2:4], (2, 1))
+        self.assertMatchesRebuild()
+
+        Comment.objects.get(pk=bad.pk).delete()  # approved since loaded; takes its reply with it
+        first.delete()
+        self.assertEqual(self.stats(), (1, 1, 0, 0, second.created_at))
+        self.assertMatchesRebuild()
+
+    def test_moderation_batch_counts_flagged_comments(self):
+        post = Post.objects.create(title='Hello', content='<p>Body</p>', author=self.author)
+        for text in (AsyncModerationTests.TOXIC_TEXT, AsyncModerationTests.CLEAN_TEXT):
+            Comment.objects.create(post=post, author=self.reader, text=text, status=PENDING_CLASSIFICATION)
+        process_pending_batch()
+        self.assertEqual(self.stats()[1:4], (2, 1, 1))
+        self.assertMatchesRebuild()
+
+    def test_rebuild_command_fixes_drift(self):
+        post = Post.objects.create(title='Hello', content='<p>Body</p>', author=self.author)
+        Comment.objects.create(post=post, author=self.reader, text='hi')
+        AuthorStats.objects.all().delete()
+        call_command('rebuild_author_stats', stdout=StringIO())
+        self.assertEqual(self.stats(), (1, 1, 1, 0, post.created_at))
+
+    def test_dashboard_shows_stats_at_constant_cost(self):
+        self.author.groups.add(Group.objects.create(name='Authors'))
+        Profile.objects.create(user=self.author)
+        post = Post.objects.create(title='Hello', content='<p>Body</p>', author=self.author)
+        self.client.force_login(self.author)
+        self.client.get(reverse('dashboard'))
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(reverse('dashboard'))
+        Comment.objects.bulk_create(Comment(post=post, author=self.reader, text=f'c{i}') for i in range(20))
+        call_command('rebuild_author_stats', stdout=StringIO())
+        with CaptureQueriesContext(connection) as after:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(len(before), len(after))
+        self.assertEqual(response.context['author_stats'].comments_per_post, 20)
+        self.assertContains(response, '20.0 per post')
+
+
+class SiteStatsTests(BlogTestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', password='pass12345')
+        self.reader = User.objects.create_user('reader', password='pass12345')
+        self.post = Post.objects.create(title='Hello', content='<p>Body</p>', author=self.admin)
+
+    def totals(self):
+        stats = get_site_stats()
+        return stats.post_count, stats.comment_count, stats.user_count, stats.moderation_count
+
+    def test_totals_and_buckets_follow_changes(self):
+        comment = Comment.objects.create(post=self.post, author=self.reader, text='hi')
+        Comment.objects.create(post=self.post, author=self.reader, text='rude', status='pending_review', toxicity_label='insult')
+        for text in (AsyncModerationTests.TOXIC_TEXT, AsyncModerationTests.CLEAN_TEXT):
+            Comment.objects.create(post=self.post, author=self.reader, text=text, status=PENDING_CLASSIFICATION)
+        process_pending_batch()
+        self.client.force_login(self.reader)
+        self.client.get(reverse('report_comment', args=[comment.pk]))
+        self.assertEqual(self.totals(), (1, 4, 2, 3))
+
+        trends = hourly_trends()
+        self.assertEqual((trends['comments'], trends['hours'][-1]['count'], trends['hours'][-1]['percent']), (4, 4, 100))
+        label = ToxicityClassifier().predict(AsyncModerationTests.TOXIC_TEXT)[1]
+        self.assertEqual(sum(count for name, count in trends['flags'] if name == label), 1 + (label == 'insult'))
+        self.assertIn(('user report', 1), trends['flags'])
+        self.assertEqual(trends['flagged'], 3)
+
+        approve_queryset(Comment.objects.all())
+        User.objects.create_user('another', password='pass12345')
+        self.post.delete()
+        self.assertEqual(self.totals(), (0, 0, 3, 0))
+
+    def test_admin_dashboard_reads_materialized_stats(self):
+        Comment.objects.create(post=self.post, author=self.reader, text='hi', status='reported')
+        Profile.objects.create(user=self.admin)
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin_dashboard'))
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql']])
+        self.assertEqual(response.context['stats'].moderation_count, 1)
+        self.assertContains(response, 'user report')
+
+    def test_reconcile_command_recounts_and_prunes(self):
+        Comment.objects.create(post=self.post, author=self.reader, text='hi')
+        SiteStats.objects.update(post_count=40, comment_count=-3)
+        HourlyStat.objects.all().delete()
+        HourlyStat.objects.create(hour=timezone.now() - timedelta(days=200), metric='flagged:insult', count=5)
+
+        out = StringIO()
+        call_command('reconcile_site_stats', stdout=out)
+        self.assertIn('post_count: 40 -> 1', out.getvalue())
+        self.assertEqual(self.totals(), (1, 1, 2, 0))
+        self.assertEqual(hourly_trends()['comments'], 1)
+        self.assertFalse(HourlyStat.objects.filter(metric='flagged:insult').exists())
+
+
+class BulkModerationTests(BlogTestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', password='pass12345')
+        self.reader = User.objects.create_user('reader', password='pass12345')
+        Profile.objects.create(user=self.reader)
+        self.post = Post.objects.create(title='Busy', content='<p>Body</p>', author=self.admin)
+        self.client.force_login(self.admin)
+
+    def flag(self, n, post=None):
+        return [
+            Comment.objects.create(post=post or self.post, author=self.reader, text=f'bad {i}', status='reported')
+            for i in range(n)
+        ]
+
+    def moderate(self, action, comments=None, **extra):
+        data = {'action': action, **extra}
+        if comments is not None:
+            data['comment_ids'] = [c.pk for c in comments]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('bulk_moderate_comments'), data)
+        return len(queries)
+
+    def test_approve_notifies_in_one_batch_at_constant_cost(self):
+        small = self.moderate('approve', self.flag(2))
+        large = self.moderate('approve', self.flag(40))
+        self.assertEqual(small, large)
+        self.assertEqual(Comment.objects.filter(status='approved').count(), 42)
+        self.assertEqual(Notification.objects.filter(message__contains='approved by an admin').count(), 42)
+        self.assertEqual(unread_notification_count(self.reader), 42)
+        self.assertEqual(get_site_stats().moderation_count, 0)
+
+    def test_reject_and_whole_queue_scope(self):
+        other = Post.objects.create(title='Other', content='<p>Body</p>', author=self.admin)
+        self.flag(3)
+        self.flag(2, post=other)
+        Comment.objects.create(post=self.post, author=self.reader, text='fine')
+        self.moderate('reject', scope='all')
+        self.assertEqual(Comment.objects.filter(status='rejected').count(), 5)
+        self.assertEqual(Comment.objects.filter(status='approved').count(), 1)
+        self.assertEqual(Notification.objects.filter(message__contains='rejected').count(), 5)
+
+    def test_delete_removes_replies_and_keeps_counters(self):
+        flagged = self.flag(3)
+        reply = Comment.objects.create(post=self.post, author=self.reader, text='reply', parent=flagged[0])
+        Comment.objects.create(post=self.post, author=self.reader, text='nested', parent=reply)
+        keep = Comment.objects.create(post=self.post, author=self.reader, text='keep')
+        Notification.objects.create(user=self.reader, message='about the reply', comment=reply)
+
+        self.moderate('delete', flagged[:2])
+        self.assertEqual(list(Comment.objects.values_list('pk', flat=True).order_by('pk')), [flagged[2].pk, keep.pk])
+        self.assertEqual(unread_notification_count(self.reader), 0)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.comment_count, self.post.approved_comment_count), (2, 1))
+        self.assertEqual(list(drifted_posts()), [])
+        self.assertEqual((get_site_stats().comment_count, get_site_stats().moderation_count), (2, 1))
+
+    def test_requires_a_selection_and_a_superuser(self):
+        self.flag(1)
+        self.moderate('approve', [])
+        self.moderate('explode', scope='all')
+        self.client.force_login(self.reader)
+        self.moderate('approve', scope='all')
+        self.assertEqual(Comment.objects.get().status, 'reported')
+
+
+class RescoreCommentsTests(BlogTestCase):
+    TOXIC_TEXT = 'you are a stupid idiot moron'
+    CLEAN_TEXT = 'thanks for sharing this, really helpful'
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', password='pass12345')
+        self.reader = User.objects.create_user('reader', password='pass12345')
+        self.post = Post.objects.create(title='Hello', content='<p>Body</p>', author=self.author)
+        add = lambda text, status='approved', label=None: Comment.objects.create(
+            post=self.post, author=self.reader, text=text, status=status, toxicity_label=label, model_version='old',
+        )
+        self.missed = add(self.TOXIC_TEXT)                                  # approved, now flagged
+        self.cleared = add(self.CLEAN_TEXT, 'pending_review', 'toxic')      # flagged, now approved
+        self.overridden = add(self.TOXIC_TEXT, 'approved', 'toxic')         # a moderator approved it
+        self.reported = add(self.CLEAN_TEXT, 'reported')                    # not the classifier's call
+
+    def rescore(self, *args):
+        out = StringIO()
+        call_command('rescore_comments', *args, stdout=out)
+        return out.getvalue()
+
+    def statuses(self):
+        return dict(Comment.objects.values_list('pk', 'status'))
+
+    def test_dry_run_reports_without_writing(self):
+        before = self.statuses()
+        output = self.rescore('--dry-run')
+        self.assertIn('2 would change', output)
+        self.assertIn('approved -> pending_review', output)
+        self.assertEqual(self.statuses(), before)
+        self.assertFalse(Comment.objects.exclude(model_version='old').exists())
+
+    def test_rescore_moves_comments_and_keeps_counters(self):
+        self.assertIn('2 changed', self.rescore('--chunk-size', '1'))
+        self.assertEqual(self.statuses(), {
+            self.missed.pk: 'pending_review', self.cleared.pk: 'approved',
+            self.overridden.pk: 'approved', self.reported.pk: 'reported',
+        })
+        self.assertIsNone(Comment.objects.get(pk=self.cleared.pk).toxicity_label)
+        self.assertEqual(Notification.objects.get().comment_id, self.missed.pk)
+        self.assertEqual(list(drifted_posts()), [])
+        self.assertEqual(get_site_stats().moderation_count, 2)
+        self.assertEqual(AuthorStats.objects.get(author=self.author).flagged_comments_received, 2)
+
+        # Everything now carries the current model version, so a rerun has nothing to do.
+        self.assertIn('Rescored 0 comments', self.rescore())
+
+    def test_comments_edited_while_scoring_are_skipped(self):
+        rows = next(iter_rescore_chunks())
+        verdicts = score_rows(rows)[1]
+        # The author edits the comment the rescore is about to flag, and a
+        # moderator rejects the one it is about to approve.
+        edited = Comment.objects.get(pk=self.missed.pk)
+        edited.text = self.CLEAN_TEXT
+        edited.save()
+        reject_comments(Comment.objects.filter(pk=self.cleared.pk))
+
+        self.assertEqual(apply_rescore(rows, verdicts), [])
+        self.assertEqual(Comment.objects.get(pk=self.missed.pk).status, 'approved')
+        self.assertEqual(Comment.objects.get(pk=self.cleared.pk).status, 'rejected')
+        self.assertEqual(Comment.objects.get(pk=self.missed.pk).model_version, 'old')  # not stamped either
+        self.assertEqual(list(drifted_posts()), [])
+
+    def test_edited_comments_lose_a_stale_flag_label(self):
+        self.client.force_login(self.reader)
+        self.client.post(reverse('edit_my_comment', args=[self.cleared.pk]), {'text': self.CLEAN_TEXT + ' indeed'})
+        edited = Comment.objects.get(pk=self.cleared.pk)
+        self.assertEqual((edited.status, edited.toxicity_label), ('approved', None))
+
+        # So a later rescore still judges it, unlike a moderator's approval.
+        Comment.objects.filter(pk=edited.pk).update(text=self.TOXIC_TEXT, model_version='old')
+        self.rescore()
+        self.assertEqual(Comment.objects.get(pk=edited.pk).status, 'pending_review')
+        self.assertEqual(Comment.objects.get(pk=self.overridden.pk).status, 'approved')
+
+    def test_checkpoint_resumes_after_the_last_comment_done(self):
+        checkpoint = os.path.join(tempfile.mkdtemp(), 'rescore.ckpt')
+        self.addCleanup(shutil.rmtree, os.path.dirname(checkpoint))
+        self.rescore('--checkpoint', checkpoint, '--start-after', str(self.missed.pk))
+        with open(checkpoint) as f:
+            self.assertEqual(int(f.read()), self.overridden.pk)
+        self.assertEqual(Comment.objects.get(pk=self.missed.pk).status, 'approved')
+
+        self.assertIn('Rescored 0 comments', self.rescore('--checkpoint', checkpoint, '--all'))
+
+
+class SiteGlobalsCacheTests(BlogTestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_site_globals()
+
+    def test_static_pages_render_without_queries_once_warm(self):
+        SiteSettings.objects.create(site_name='Sanity Check')
+        self.client.get(reverse('about'))
+        for name in ('about', 'privacy'):
+            with self.assertNumQueries(0):
+                response = self.client.get(reverse(name))
+            self.assertContains(response, 'Sanity Check')
+
+    def test_editing_site_settings_invalidates(self):
+        settings_row = SiteSettings.objects.create(site_name='Old Name')
+        self.assertContains(self.client.get(reverse('about')), 'Old Name')
+        settings_row.site_name = 'New Name'
+        settings_row.save()
+        response = self.client.get(reverse('about'))
+        self.assertContains(response, 'New Name')
+        self.assertNotContains(response, 'Old Name')
+
+
+class UnreadNotificationCounterTests(BlogTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='pass12345')
+        self.admin = User.objects.create_superuser('admin', password='pass12345')
+        Profile.objects.create(user=self.user)
+        self.post = Post.objects.create(title='Hello', content='<p>Body</p>', author=self.admin)
+        self.comment = Comment.objects.create(post=self.post, author=self.user, text='hi', status='pending_review')
+
+    def unread(self):
+        return Profile.objects.get(user=self.user).unread_notification_count
+
+    def test_counter_follows_creates_reads_and_deletes(self):
+        self.client.force_login(self.admin)
+        self.client.get(reverse('approve_comment', args=[self.comment.pk]))
+        Notification.objects.create(user=self.user, message='already seen', read=True)
+        notifications_created(Notification.objects.bulk_create([Notification(user=self.user, message='bulk')]))
+        self.assertEqual(self.unread(), 2)
+
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('about'))
+        self.assertEqual(response.context['unread_notifications_count'], 2)
+        self.assertFalse([q for q in queries if 'FROM "blog_notification"' in q['sql']])
+
+        self.client.get(reverse('dashboard'))
+        self.assertEqual(self.unread(), 0)
+
+        Notification.objects.create(user=self.user, message='again', comment=self.comment)
+        self.assertEqual(self.unread(), 1)
+        self.comment.delete()  # cascades to the notification
+        self.assertEqual(self.unread(), 0)
+
+    def test_profile_created_by_a_view_counts_earlier_notifications(self):
+        newcomer = User.objects.create_user('newcomer', password='pass12345')
+        Notification.objects.create(user=newcomer, message='one')
+        Notification.objects.create(user=newcomer, message='two')
+        Notification.objects.create(user=newcomer, message='seen', read=True)
+        self.assertFalse(Profile.objects.filter(user=newcomer).exists())
+
+        self.client.get(reverse('profile_page', args=['newcomer']))  # creates the Profile
+        self.assertEqual(Profile.objects.get(user=newcomer).unread_notification_count, 2)
+
+        self.client.force_login(newcomer)
+        response = self.client.get(reverse('profile_page', args=['newcomer']))
+        self.assertEqual(response.context['unread_notifications_count'], 2)
+        self.assertContains(response, '>2<')
+        self.client.get(reverse('dashboard'))  # marks them read
+        self.assertEqual(Profile.objects.get(user=newcomer).unread_notification_count, 0)
+
+        # profile_edit (not routed) creates Profiles through the same helper.
+        other = User.objects.create_user('other', password='pass12345')
+        Notification.objects.create(user=other, message='one')
+        self.assertEqual(get_or_create_profile(other).unread_notification_count, 1)
+        self.assertEqual(get_or_create_profile(other).unread_notification_count, 1)
+
+    def test_missing_profile_is_seeded(self):
+        Notification.objects.create(user=self.admin, message='one')
+        self.assertEqual(unread_notification_count(self.admin), 1)
+        self.assertEqual(Profile.objects.get(user=self.admin).unread_notification_count, 1)
+
+
+class PostSearchTests(BlogTestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', password='pass12345')
+
+    def search(self, query, page=1):
+        return self.client.get(reverse('search_results'), {'q': query, 'page': page})
+
+    def test_ranked_match_with_highlighted_snippet(self):
+        body = Post.objects.create(title='Weekend notes', content='<p>We went <b>gardening</b> &amp; hiking.</p>', author=self.author)
+        title = Post.objects.create(title='Gardening basics', content='<p>Soil first.</p>', author=self.author)
+        Post.objects.create(title='Unrelated', content='<p>Nothing <span class="gardening">here</span>.</p>', author=self.author)
+
+        response = self.search('garden')
+        posts = list(response.context['posts'])
+        self.assertEqual(posts, [title, body])  # title matches rank first; markup is not indexed
+        self.assertEqual(posts[1].snippet, 'We went <mark>gardening</mark> &amp; hiking.')
+        self.assertContains(response, '<mark>Gardening</mark> basics', html=False)
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.objects.create(title='Draft', content='<p>alpha</p>', author=self.author)
+        post.content = '<p>beta</p>'
+        post.save()
+        self.assertEqual(list(self.search('alpha').context['posts']), [])
+        self.assertEqual(list(self.search('beta').context['posts']), [post])
+        post.delete()
+        self.assertEqual(list(self.search('beta').context['posts']), [])
+
+    def test_pagination_and_operator_input(self):
+        for i in range(12):
+            Post.objects.create(title=f'Recipe {i}', content='<p>soup</p>', author=self.author)
+        self.assertEqual(len(self.search('soup').context['posts']), 10)
+        self.assertEqual(len(self.search('soup', page=2).context['posts']), 2)
+        self.assertEqual(self.search('soup OR NOT "(').status_code, 200)
+        self.assertEqual(len(self.search('').context['posts']), 0)
+
+
+class CursorPaginationTests(BlogTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pass12345')
+        self.admin = User.objects.create_superuser('admin', password='pass12345')
+        moment = timezone.now()
+        # Several rows share a timestamp, so the id tie-breaker matters.
+        self.posts = [
+            Post.objects.create(title=f'Post {i}', content='<p>Body</p>', author=self.author,
+                                photo='post_photos/p.jpg', created_at=moment - timedelta(minutes=i // 3))
+            for i in range(12)
+        ]
+        self.newest_first = sorted(self.posts, key=lambda p: (p.created_at, p.pk), reverse=True)
+
+    def test_post_list_walks_forward_and_back(self):
+        seen, cursor, pages = [], None, []
+        while True:
+            response = self.client.get(reverse('post_list'), {'cursor': cursor} if cursor else {})
+            page = response.context['page_obj']
+            pages.append(page)
+            seen.extend(page.object_list)
+            if not page.has_next():
+                break
+            self.assertContains(response, '?cursor=')
+            cursor = page.next_cursor
+        self.assertEqual(seen, self.newest_first)
+        self.assertEqual([len(p) for p in pages], [5, 5, 2])
+
+        back = self.client.get(reverse('post_list'), {'cursor': pages[-1].previous_cursor}).context['page_obj']
+        self.assertEqual(back.object_list, pages[1].object_list)
+        self.assertTrue(back.has_previous() and back.has_next())
+
+    def test_tampered_cursor_restarts(self):
+        response = self.client.get(reverse('post_list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.context['page_obj'].object_list, self.newest_first[:5])
+
+    def test_moderation_queue_pages_without_count(self):
+        for i in range(12):
+            Comment.objects.create(post=self.posts[0], author=self.author, text=f'flagged {i}', status='reported')
+        Comment.objects.create(post=self.posts[0], author=self.author, text='fine')
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin_comments'))
+        self.assertEqual(len(response.context['comments']), 10)
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql'] and 'blog_comment' in q['sql']])
+        second = self.client.get(reverse('admin_comments'), {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual(len(second.context['comments']), 2)
+
+
+class QueryBudgetTests(BlogTestCase):
+    """
+    Pins the number of queries and the shape of every SELECT's query plan for
+    each view in blog/urls.py. The fixture has several rows per relation, so
+    an N+1 blows the budget; a plan that scans a growing table or sorts
+    without an index fails the plan check.
+
+    When a change legitimately needs more queries, update the budget here.
+    """
+
+    # (url name, who is logged in, HTTP method, query budget, plan lines allowed despite the rules below)
+    BUDGETS = [
+        ('post_list', None, 'get', 1, ()),
+        ('post_detail', None, 'get', 2, ()),
+        ('about', None, 'get', 0, ()),
+        ('privacy', None, 'get', 0, ()),
+        ('contacts', None, 'get', 0, ()),
+        ('register', None, 'get', 0, ()),
+        # bm25 ranking sorts the matches; FTS5 cannot return them in rank order.
+        ('search_results', None, 'get', 3, ('USE TEMP B-TREE FOR ORDER BY',)),
+        ('profile_page', None, 'get', 7, ()),
+        ('dashboard', 'author', 'get', 12, ()),
+        ('dashboard_tab', 'reader', 'get', 3, ()),
+        ('check_availability', 'reader', 'get', 3, ()),
+        ('post_create', 'admin', 'get', 4, ()),
+        ('post_update', 'author', 'get', 9, ()),
+        ('post_delete', 'author', 'get', 8, ()),
+        ('add_comment', 'reader', 'post', 8, ()),
+        ('edit_my_comment', 'reader', 'get', 7, ()),
+        ('delete_my_comment', 'reader', 'get', 23, ()),
+        ('report_comment', 'reader', 'get', 9, ()),
+        ('admin_dashboard', 'admin', 'get', 9, ()),
+        ('classifier_metrics', 'admin', 'get', 3, ()),
+        ('classifier_metrics_prometheus', 'admin', 'get', 2, ()),
+        ('admin_comments', 'admin', 'get', 5, ()),
+        ('approve_comment', 'admin', 'get', 13, ()),
+        ('delete_comment', 'admin', 'get', 14, ()),
+        ('bulk_moderate_comments', 'admin', 'post', 16, ()),
+    ]
+
+    # Growing tables must be searched through an index, never scanned whole,
+    # and results must come out of an index already in order.
+    FULL_SCAN = re.compile(r'\bSCAN (blog_post|blog_comment|blog_notification|blog_profile|blog_hourlystat)\b(?! USING INDEX)')
+    TEMP_SORT = 'USE TEMP B-TREE'
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', password='pass12345')
+        self.author = User.objects.create_user('author', password='pass12345')
+        self.author.groups.add(Group.objects.create(name='Authors'))
+        self.reader = User.objects.create_user('reader', password='pass12345')
+        for user in (self.admin, self.author, self.reader):
+            Profile.objects.create(user=user)
+        SiteSettings.objects.create()
+        genre = Genre.objects.create(name='News')
+
+        self.posts = [
+            Post.objects.create(title=f'Post {i}', content='<p>searchable body</p>', author=self.author,
+                                genre=genre, photo='post_photos/p.jpg')
+            for i in range(6)
+        ]
+        self.comments = []
+        for post in self.posts:
+            root = Comment.objects.create(post=post, author=self.reader, text='nice post')
+            reply = Comment.objects.create(post=post, author=self.author, text='thanks', parent=root)
+            flagged = Comment.objects.create(post=post, author=self.reader, text='flagged', parent=reply, status='reported')
+            Notification.objects.create(user=self.reader, message='note', comment=root)
+            Notification.objects.create(user=self.author, message='note', comment=reply)
+            self.comments += [root, reply, flagged]
+
+    # Views that change data are measured on their first request; the rest after a warm-up request.
+    MUTATING = {
+        'add_comment', 'delete_my_comment', 'report_comment', 'approve_comment', 'delete_comment',
+        'bulk_moderate_comments',
+    }
+
+    def url_for(self, name):
+        post, comments = self.posts[0], self.comments
+        # Each mutating view gets its own comment; delete_my_comment removes a whole thread.
+        args = {
+            'post_detail': [post.pk], 'post_update': [post.pk], 'post_delete': [post.pk], 'add_comment': [post.pk],
+            'profile_page': ['reader'], 'edit_my_comment': [comments[0].pk], 'delete_my_comment': [comments[6].pk],
+            'report_comment': [comments[3].pk], 'approve_comment': [comments[2].pk], 'delete_comment': [comments[5].pk],
+            'dashboard_tab': ['comments'],
+        }.get(name, [])
+        url = reverse(name, args=args)
+        return url + {'search_results': '?q=searchable', 'check_availability': '?username=author'}.get(name, '')
+
+    def post_data(self, name):
+        if name == 'bulk_moderate_comments':
+            return {'action': 'approve', 'comment_ids': [c.pk for c in self.comments[8::3]]}
+        return {'text': 'a friendly comment'}
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[3] for row in cursor.fetchall()]
+
+    def test_views_stay_within_query_budget_and_use_indexes(self):
+        users = {'admin': self.admin, 'author': self.author, 'reader': self.reader}
+        for name, who, method, budget, allowed in self.BUDGETS:
+            with self.subTest(view=name):
+                self.client.logout()
+                if who:
+                    self.client.force_login(users[who])
+                url = self.url_for(name)
+                self.client.get(reverse('about') if name in self.MUTATING else url)  # warm the caches
+                with CaptureQueriesContext(connection) as queries:
+                    response = getattr(self.client, method)(url, self.post_data(name) if method == 'post' else None)
+                self.assertLess(response.status_code, 400)
+                sql = [q['sql'] for q in queries]
+                self.assertLessEqual(len(sql), budget, '\n'.join(sql))
+
+                for statement in sql:
+                    if not statement.startswith('SELECT'):
+                        continue
+                    for line in self.plan(statement):
+                        if any(line.startswith(ok) for ok in allowed):
+                            continue
+                        self.assertIsNone(self.FULL_SCAN.search(line), f'{line}\n{statement}')
+                        self.assertNotIn(self.TEMP_SORT, line, statement)
+
+
+    def test_every_view_has_a_budget(self):
+        budgeted = {name for name, *_ in self.BUDGETS}
+        for pattern in blog_urls.urlpatterns:
+            with self.subTest(url=str(pattern.pattern)):
+                self.assertIsNotNone(pattern.name, 'Name the URL so it can be given a query budget.')
+                self.assertIn(pattern.name, budgeted, 'Add the view to QueryBudgetTests.BUDGETS.')
+
+
+class DashboardTabTests(BlogTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='pass12345')
+        Profile.objects.create(user=self.user)
+        self.post = Post.objects.create(title='Busy thread', content='<p>Body</p>', author=self.user)
+        self.client.force_login(self.user)
+
+    def add_comments(self, n, **fields):
+        Comment.objects.bulk_create(Comment(post=self.post, author=self.user, text=f'comment {i}', **fields) for i in range(n))
+
+    def dashboard_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('dashboard'))
+        return len(queries)
+
+    def test_dashboard_cost_does_not_grow_with_history(self):
+        self.add_comments(3)
+        self.add_comments(2, status='pending_review')
+        self.client.get(reverse('dashboard'))  # warm-up
+        baseline = self.dashboard_queries()
+        self.add_comments(40)
+        self.add_comments(30, status='pending_review')
+        self.assertEqual(self.dashboard_queries(), baseline)
+
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(len(response.context['action_required_comments']), 10)
+        self.assertContains(response, '10+')
+        self.assertNotContains(response, 'comment 39')  # history is left to the tab
+
+    def test_tab_pages_follow_the_cursor_without_repeats(self):
+        self.add_comments(25)
+        url = reverse('dashboard_tab', args=['comments'])
+        seen = []
+        cursor = None
+        while True:
+            response = self.client.get(url, {'cursor': cursor} if cursor else None)
+            page = response.context['page_obj']
+            seen += [comment.pk for comment in page]
+            if not page.has_next():
+                self.assertNotContains(response, 'data-load-more')
+                break
+            self.assertContains(response, 'data-load-more')
+            cursor = page.next_cursor
+        self.assertEqual(seen, list(Comment.objects.order_by('-created_at', '-pk').values_list('pk', flat=True)))
+
+    def test_posts_tab_is_for_authors_only(self):
+        self.assertEqual(self.client.get(reverse('dashboard_tab', args=['posts'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('dashboard_tab', args=['nope'])).status_code, 404)
+        self.user.groups.add(Group.objects.create(name='Authors'))
+        self.assertContains(self.client.get(reverse('dashboard_tab', args=['posts'])), 'Busy thread')
+
+
+class AvailabilityCheckTests(BlogTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reader', email='reader@example.com', password='pass12345')
+        Profile.objects.create(user=self.user)
+        User.objects.create_user('taken', email='taken@example.com', password='pass12345')
+        self.client.force_login(self.user)
+
+    def check(self, **params):
+        return self.client.get(reverse('check_availability'), params)
+
+    def test_reports_taken_and_free_values(self):
+        self.assertFalse(self.check(username='taken').json()['available'])
+        self.assertFalse(self.check(email='taken@example.com').json()['available'])
+        self.assertTrue(self.check(username='someone-new').json()['available'])
+        # Your own current name is yours to keep.
+        self.assertTrue(self.check(username='reader').json()['available'])
+        self.assertEqual(self.check().status_code, 400)
+
+    @override_settings(AVAILABILITY_CHECKS_PER_MINUTE=2)
+    def test_checks_are_rate_limited_per_user(self):
+        self.assertEqual(self.check(username='a').status_code, 200)
+        self.assertEqual(self.check(username='b').status_code, 200)
+        self.assertEqual(self.check(username='c').status_code, 429)
+
+    def test_dashboard_does_not_ship_other_usernames(self):
+        response = self.client.get(reverse('dashboard'))
+        self.assertNotIn('existing_usernames', response.context)
+        self.assertNotContains(response, 'taken')
+
+    def test_update_form_rejects_taken_username_and_email(self):
+        response = self.client.post(reverse('dashboard'), {'username': 'taken', 'email': 'taken@example.com'})
+        form = response.context['u_form']
+        self.assertEqual(form.errors['username'], ['This username is already taken.'])
+        self.assertEqual(form.errors['email'], ['This email is already taken.'])
+
+
+class RequestProfilerTests(BlogTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='pass12345')
+        self.post = Post.objects.create(title='Profiled', content='<p>Body</p>', author=self.user)
+
+    @override_settings(REQUEST_PROFILER_SAMPLE_RATE=1.0)
+    def test_sampled_request_is_logged_with_server_timing(self):
+        self.client.force_login(self.user)
+        with self.assertLogs('blog.profiler', 'INFO') as logs, CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('add_comment', args=[self.post.pk]), {'text': 'lovely write-up'}, follow=True)
+        lines = [json.loads(record.getMessage()) for record in logs.records]
+        add, detail = lines
+        self.assertEqual((add['view'], add['status']), ('add_comment', 302))
+        self.assertEqual((detail['view'], detail['status']), ('post_detail', 200))
+        self.assertEqual(add['queries'] + detail['queries'], len(queries))
+        self.assertGreater(add['classifier_ms'], 0)
+        self.assertGreater(detail['template_ms'], 0)
+        self.assertLessEqual(len(detail['slowest_queries']), 3)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+;desc="Templates", total;dur=[\d.]+$')
+
+    @override_settings(REQUEST_PROFILER_SAMPLE_RATE=0.5)
+    def test_template_timer_is_only_installed_while_profiling(self):
+        original = DjangoTemplate.render
+        seen = []
+        real_get_response = RequestProfilerMiddleware.__call__
+
+        def spy(middleware, request):
+            seen.append(DjangoTemplate.render is original)
+            return real_get_response(middleware, request)
+
+        url = reverse('post_detail', args=[self.post.pk])
+        with mock.patch.object(RequestProfilerMiddleware, '__call__', spy), \
+                mock.patch('blog.middleware.random.random', side_effect=[0.9, 0.1]), \
+                self.assertLogs('blog.profiler', 'INFO') as logs:
+            self.client.get(url)  # not sampled
+            self.client.get(url)  # sampled
+        self.assertEqual(len(logs.records), 1)
+        self.assertGreater(json.loads(logs.records[0].getMessage())['template_ms'], 0)
+        self.assertEqual(seen, [True, True])
+        self.assertIs(DjangoTemplate.render, original)
+
+    @override_settings(REQUEST_PROFILER_SAMPLE_RATE=0.0)
+    def test_disabled_profiler_is_not_installed(self):
+        response = self.client.get(reverse('post_detail', args=[self.post.pk]))
+        self.assertNotIn('Server-Timing', response)
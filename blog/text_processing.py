@@ -0,0 +1,73 @@
+"""
+Text preprocessing shared by training (training.py) and serving (ai_toxicity.py).
+
+``stem`` and ``preprocess`` are the reference definitions the model was
+trained with. ``Tokenizer`` is the fast path actually used on the hot path;
+it must produce exactly the same tokens (see blog/tests.py).
+"""
+import re
+
+STOP_WORDS = frozenset({
+    'i','me','my','myself','we','our','ours','ourselves','you','your','yours','yourself',
+    'yourselves','he','him','his','himself','she','her','herself','it','its','itself',
+    'they','them','their','theirs','themselves','what','which','who','whom','this','that','these',
+    'those','am','is','are','was','were','be','been','being','have','has','had','having','do',
+    'does','did','doing','a','an','the','and','but','if','or','because','as','until','while','of',
+    'at','by','for','with','about','against','between','into','through','during','before','after',
+    'above','below','to','from','up','down','in','out','on','off','over','under','again','further',
+    'then','once','here','there','when','where','why','how','all','any','both','each','few','more',
+    'most','other','some','such','no','nor','not','only','own','same','so','than','too','very',
+    'can','will','just','don','should','now'
+})
+
+SUFFIXES = ('ing', 'ly', 'ed', 's', 'es')
+
+_NON_ALPHA = re.compile(r'[^a-z\s]')
+
+# For pure-ASCII text (the vast majority of comments) str.translate with a
+# delete table is about twice as fast as the regex; it is derived from the
+# regex so the two can never disagree.
+_ASCII_DELETE = str.maketrans('', '', ''.join(c for c in map(chr, range(128)) if _NON_ALPHA.match(c)))
+
+
+def stem(word):
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) > len(suffix) + 2:
+            return word[:-len(suffix)]
+    return word
+
+
+def preprocess(text, stop_words=STOP_WORDS):
+    text = str(text).lower()
+    text = re.sub(r'[^a-z\s]', '', text)
+    tokens = text.split()
+    return [stem(word) for word in tokens if word not in stop_words]
+
+
+class Tokenizer:
+    """
+    Fast equivalent of ``preprocess``: precompiled character stripping,
+    frozen stop words and a memoized stem table holding at most
+    ``max_stems`` entries (normally the vocabulary size).
+    """
+
+    def __init__(self, stop_words=STOP_WORDS, max_stems=100_000):
+        self.stop_words = frozenset(stop_words)
+        self.max_stems = max_stems
+        self._stems = {}
+
+    def _stem(self, word):
+        stemmed = stem(word)
+        if len(self._stems) < self.max_stems:
+            self._stems[word] = stemmed
+        return stemmed
+
+    def __call__(self, text):
+        text = str(text).lower()
+        if text.isascii():
+            text = text.translate(_ASCII_DELETE)
+        else:
+            text = _NON_ALPHA.sub('', text)
+        stop_words, stems, miss = self.stop_words, self._stems, self._stem
+        # A stem is never empty, so `or` only falls through on a cache miss.
+        return [stems.get(w) or miss(w) for w in text.split() if w not in stop_words]
@@ -0,0 +1,179 @@
+"""
+Streaming Naive Bayes training for the toxicity classifier
+(used by `manage.py train_toxicity`).
+
+The dataset is read in chunks and each chunk is tokenized and counted in a
+worker process with a single np.bincount, so training time grows linearly
+with the number of rows and memory is bounded by the vocabulary, not the
+dataset. The train/test split is drawn from a seeded generator whose stream
+does not depend on the chunk size, so a given seed always gives the same split.
+"""
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from .text_processing import STOP_WORDS, Tokenizer
+
+NON_TOXIC_LABEL = 'non-toxic'
+
+_tokenizer = Tokenizer(STOP_WORDS)
+
+
+def iter_chunks(dataset_path, chunk_size, test_fraction, seed):
+    """Yields (texts, labels, is_test) per chunk of the CSV dataset."""
+    rng = np.random.default_rng(seed)
+    for frame in pd.read_csv(dataset_path, usecols=['comment_text', 'label'], chunksize=chunk_size):
+        is_test = rng.random(len(frame)) < test_fraction
+        yield frame['comment_text'].tolist(), frame['label'].astype(str).tolist(), is_test
+
+
+def count_chunk(texts, labels):
+    """
+    Worker: tokenizes one chunk of training rows. Returns the chunk's words,
+    its labels, a (labels x words) token-count matrix and per-label row counts.
+    """
+    words, label_ids = {}, {}
+    token_word_ids, token_label_ids, row_label_ids = [], [], []
+    for text, label in zip(texts, labels):
+        lid = label_ids.setdefault(label, len(label_ids))
+        row_label_ids.append(lid)
+        tokens = _tokenizer(text)
+        token_word_ids.extend(words.setdefault(w, len(words)) for w in tokens)
+        token_label_ids.extend([lid] * len(tokens))
+
+    n_labels, n_words = len(label_ids), len(words)
+    flat = np.asarray(token_label_ids, dtype=np.int64) * n_words + np.asarray(token_word_ids, dtype=np.int64)
+    token_counts = np.bincount(flat, minlength=n_labels * n_words).reshape(n_labels, n_words)
+    row_counts = np.bincount(np.asarray(row_label_ids, dtype=np.int64), minlength=n_labels)
+    return list(words), list(label_ids), token_counts, row_counts
+
+
+def tokenize_chunk(texts):
+    """Worker: tokenizes one chunk of evaluation rows."""
+    return [_tokenizer(text) for text in texts]
+
+
+def map_bounded(pool, fn, arg_tuples, max_pending):
+    """
+    Like pool.map, but keeps at most ``max_pending`` chunks in flight so a
+    huge dataset is never read into memory ahead of the workers.
+    Without a pool the chunks are processed in this process.
+    """
+    if pool is None:
+        for args in arg_tuples:
+            yield fn(*args)
+        return
+    pending = deque()
+    for args in arg_tuples:
+        pending.append(pool.submit(fn, *args))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class NaiveBayesCounts:
+    """Accumulates per-chunk counts into global (labels x vocabulary) arrays."""
+
+    def __init__(self):
+        self.vocab = {}
+        self.labels = {}
+        self.token_counts = np.zeros((0, 1024), dtype=np.int64)
+        self.row_counts = np.zeros(0, dtype=np.int64)
+
+    def _grow(self, n_labels, n_words):
+        rows, capacity = self.token_counts.shape
+        if n_words > capacity or n_labels > rows:
+            while capacity < n_words:
+                capacity *= 2
+            grown = np.zeros((n_labels, capacity), dtype=np.int64)
+            grown[:rows, :self.token_counts.shape[1]] = self.token_counts
+            self.token_counts = grown
+        if n_labels > len(self.row_counts):
+            self.row_counts = np.concatenate([self.row_counts, np.zeros(n_labels - len(self.row_counts), dtype=np.int64)])
+
+    def add(self, words, labels, token_counts, row_counts):
+        word_ids = np.fromiter((self.vocab.setdefault(w, len(self.vocab)) for w in words), dtype=np.intp, count=len(words))
+        label_ids = np.fromiter((self.labels.setdefault(l, len(self.labels)) for l in labels), dtype=np.intp, count=len(labels))
+        self._grow(len(self.labels), len(self.vocab))
+        # Ids are unique within a chunk, so a plain fancy-indexed += is safe.
+        self.token_counts[np.ix_(label_ids, word_ids)] += token_counts
+        self.row_counts[label_ids] += row_counts
+
+    def to_artifacts(self, alpha=1):
+        """Returns the artifacts dict stored in naive_bayes_model.pkl."""
+        vocab = sorted(self.vocab)
+        word2idx = {word: i for i, word in enumerate(vocab)}
+        columns = np.fromiter((self.vocab[w] for w in vocab), dtype=np.intp, count=len(vocab))
+        classes = sorted(self.labels)
+        total_rows = int(self.row_counts.sum())
+
+        priors, likelihoods, total_words_per_class = {}, {}, {}
+        for c in classes:
+            counts = self.token_counts[self.labels[c], columns]
+            total_words_per_class[c] = len(vocab) * alpha + int(counts.sum())
+            likelihoods[c] = np.log((counts + alpha) / total_words_per_class[c])
+            priors[c] = np.log(self.row_counts[self.labels[c]] / total_rows)
+
+        return {
+            "word2idx": word2idx, "classes": classes, "priors": priors,
+            "likelihoods": likelihoods, "total_words_per_class": total_words_per_class,
+            "alpha": alpha, "stop_words": set(STOP_WORDS), "non_toxic_label": NON_TOXIC_LABEL,
+        }
+
+
+def train(chunks, pool=None, max_pending=4):
+    """Counts the training rows of ``chunks`` (from iter_chunks) and returns the artifacts dict."""
+    def training_rows():
+        for texts, labels, is_test in chunks:
+            keep = np.flatnonzero(~is_test)
+            yield [texts[i] for i in keep], [labels[i] for i in keep]
+
+    counts = NaiveBayesCounts()
+    for result in map_bounded(pool, count_chunk, training_rows(), max_pending):
+        counts.add(*result)
+    return counts.to_artifacts()
+
+
+def evaluate(artifacts, chunks, pool=None, max_pending=4):
+    """
+    Scores the test rows of ``chunks`` by plain arg-max over class scores (no
+    threshold) and returns a {true_label: {predicted_label: count}} confusion matrix.
+    """
+    classes = artifacts['classes']
+    word2idx = artifacts['word2idx']
+    oov = len(word2idx)
+    totals = np.array([artifacts['total_words_per_class'][c] for c in classes], dtype=np.float64)
+    matrix = np.hstack([
+        np.vstack([artifacts['likelihoods'][c] for c in classes]),
+        np.log(artifacts['alpha'] / totals)[:, None],
+        np.zeros((len(classes), 1)),  # lets reduceat start at the end for empty trailing rows
+    ])
+    priors = np.array([artifacts['priors'][c] for c in classes])
+    conf_matrix = {t: {p: 0 for p in classes} for t in classes}
+
+    # map_bounded returns results in submission order, so the labels of each
+    # chunk can simply be queued alongside it.
+    label_queue = deque()
+
+    def test_rows():
+        for texts, labels, is_test in chunks:
+            keep = np.flatnonzero(is_test)
+            label_queue.append([labels[i] for i in keep])
+            yield ([texts[i] for i in keep],)
+
+    for token_lists in map_bounded(pool, tokenize_chunk, test_rows(), max_pending):
+        labels = label_queue.popleft()
+        if not token_lists:
+            continue
+        offsets = np.zeros(len(token_lists) + 1, dtype=np.intp)
+        offsets[1:] = np.cumsum([len(t) for t in token_lists])
+        flat = np.fromiter((word2idx.get(w, oov) for tokens in token_lists for w in tokens), dtype=np.intp, count=offsets[-1])
+        sums = np.add.reduceat(np.take(matrix, np.append(flat, oov + 1), axis=1), offsets[:-1], axis=1)
+        sums[:, offsets[1:] == offsets[:-1]] = 0.0
+        predicted = (priors[:, None] + sums).argmax(axis=0)
+        for true_label, p in zip(labels, predicted.tolist()):
+            if true_label in conf_matrix:
+                conf_matrix[true_label][classes[p]] += 1
+    return conf_matrix
@@ -28,6 +28,8 @@ urlpatterns = [
 
     # --- PROTECTED User and Admin Views (Login Required) ---
     path('dashboard/', views.dashboard, name='dashboard'), # Dashboard has its own URL.
+    path('dashboard/tab/<str:tab>/', views.dashboard_tab, name='dashboard_tab'),
+    path('dashboard/availability/', views.check_availability, name='check_availability'),
     path('post/new/', views.PostCreateView.as_view(), name='post_create'),
     path('post/<int:pk>/update/', views.PostUpdateView.as_view(), name='post_update'),
     path('post/<int:pk>/delete/', views.PostDeleteView.as_view(), name='post_delete'),
@@ -40,7 +42,10 @@ urlpatterns = [
 
     # --- PROTECTED Admin Views ---
     path('admin/dashboard/', views.admin_dashboard, name='admin_dashboard'),
+    path('admin/classifier-metrics/', views.classifier_metrics_view, name='classifier_metrics'),
+    path('admin/classifier-metrics/prometheus/', views.classifier_metrics_prometheus, name='classifier_metrics_prometheus'),
     path('admin/comments/', views.admin_comments, name='admin_comments'),
     path('admin/comment/<int:pk>/approve/', views.approve_comment, name='approve_comment'),
     path('admin/comment/<int:pk>/delete/', views.delete_comment, name='delete_comment'),
+    path('admin/comments/bulk/', views.bulk_moderate_comments, name='bulk_moderate_comments'),
 ]
\ No newline at end of file
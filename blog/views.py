@@ -2,77 +2,113 @@
 
 # --- Django and Python Imports ---
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin, PermissionRequiredMixin
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_POST
 from django.contrib import messages
 from django.urls import reverse_lazy
-from django.db.models import Count, Q
+from django.db.models import Q
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator
-from django.utils import timezone
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
 
 
 
 # --- Your Application's Imports ---
 # CORRECTED: Added 'Profile' to the model imports
-from .models import Post, Comment, Notification, Genre, Profile 
+from .models import AuthorStats, Post, Comment, Notification, Genre, Profile 
 # CORRECTED: Combined all form imports into one line for cleanliness
 from .forms import PostForm, CommentForm, UserRegisterForm, UserUpdateForm, ProfileUpdateForm 
-from .ai_toxicity import toxicity_classifier # Assuming this file exists in your app
+from .accounts import allow_availability_check, email_taken, username_taken
+from .ai_toxicity import get_toxicity_classifier, load_timings
+from .classifier_metrics import classifier_metrics
+from .moderation import PENDING_CLASSIFICATION, approve_comments, delete_comments, reject_comments
+from .counters import get_or_create_profile, mark_notifications_read
+from .pagination import CURSOR_PARAM, CursorPaginationMixin, newest, paginate_by_cursor
+from .search import search_posts
+from .sidebar import get_sidebar
+from .site_stats import get_site_stats, hourly_trends
 
 
 # ==============================================================================
 # --- PUBLIC-FACING VIEWS (Visible to Everyone) ---
 # ==============================================================================
 
-class PostListView(ListView):
+class PostListView(CursorPaginationMixin, ListView):
     model = Post
     template_name = 'blog/post_list.html'
     context_object_name = 'posts'
     ordering = ['-created_at']
     paginate_by = 5
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('author', 'genre')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['featured_post'] = Post.objects.order_by('-created_at').first()
-        context['popular_posts'] = Post.objects.annotate(comment_count=Count('comments')).order_by('-comment_count')[:5]
-        context['recent_comments'] = Comment.objects.filter(status='approved').order_by('-created_at')[:5]
-        context['all_genres'] = Genre.objects.all()
+        # featured_post, popular_posts, recent_comments and all_genres (see blog/sidebar.py).
+        context.update(get_sidebar())
         return context
 
+def build_comment_tree(comments):
+    """
+    Links an ordered list of comments into a tree in memory. Each comment gets
+    a `children` list; returns the top-level comments. Replies whose parent is
+    not in the list are dropped, just as they were never reachable before.
+    """
+    by_id = {comment.pk: comment for comment in comments}
+    roots = []
+    for comment in comments:
+        comment.children = []
+    for comment in comments:
+        if comment.parent_id is None:
+            roots.append(comment)
+        elif comment.parent_id in by_id:
+            by_id[comment.parent_id].children.append(comment)
+    return roots
+
 class PostDetailView(DetailView):
     model = Post
     template_name = 'blog/post_detail.html'
+
+    def get_queryset(self):
+        return Post.objects.select_related('author', 'genre')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['form'] = CommentForm()
         user = self.request.user
-        post = self.get_object()
+        post = self.object
         if user.is_authenticated:
-            context['comments'] = post.comments.filter(Q(status='approved') | Q(author=user)).distinct().order_by('created_at')
+            visible = Q(status='approved') | Q(author=user)
         else:
-            context['comments'] = post.comments.filter(status='approved').order_by('created_at')
+            visible = Q(status='approved')
+        # One query for every visible comment; the reply tree is built in memory.
+        comments = list(post.comments.filter(visible).select_related('author').order_by('created_at'))
+        context['comments'] = comments
+        context['comment_tree'] = build_comment_tree(comments)
         return context
 
 def search_results(request):
-    query = request.GET.get('q')
-    posts = Post.objects.filter(Q(title__icontains=query) | Q(content__icontains=query)).distinct().order_by('-created_at') if query else Post.objects.none()
-    return render(request, 'blog/search_results.html', {'posts': posts, 'query': query})
+    query = request.GET.get('q', '')
+    paginator = Paginator(search_posts(query), 10); page_obj = paginator.get_page(request.GET.get('page'))
+    return render(request, 'blog/search_results.html', {'posts': page_obj, 'page_obj': page_obj, 'query': query})
 
 def profile_page(request, username):
     profile_user = get_object_or_404(User, username=username)
-    Profile.objects.get_or_create(user=profile_user) # This will now work
+    get_or_create_profile(profile_user) # This will now work
     context = {
         'profile_user': profile_user,
         'posts': Post.objects.filter(author=profile_user).order_by('-created_at'),
-        'comments': Comment.objects.filter(author=profile_user, status='approved').order_by('-created_at'),
+        'comments': Comment.objects.filter(author=profile_user, status='approved').select_related('post').order_by('-created_at'),
     }
     return render(request, 'blog/profile_page.html', context) # You were missing a return here
 @login_required
 def profile_edit(request):
-    Profile.objects.get_or_create(user=request.user)
+    get_or_create_profile(request.user)
 
     if request.method == 'POST':
         u_form = UserUpdateForm(request.POST, instance=request.user)
@@ -130,7 +166,13 @@ def add_comment(request, pk):
         form = CommentForm(request.POST)
         if form.is_valid():
             comment = form.save(commit=False); comment.post = post; comment.author = request.user
-            is_toxic, label = toxicity_classifier.predict(comment.text)
+            if settings.TOXICITY_ASYNC_MODERATION:
+                # Save now; `manage.py moderate_comments` classifies it in the background.
+                comment.status = PENDING_CLASSIFICATION; comment.save()
+                messages.info(request, 'Your comment has been received and will appear once it has been checked.')
+                return redirect('post_detail', pk=post.pk)
+            classifier = get_toxicity_classifier()
+            is_toxic, label = classifier.predict(comment.text); comment.model_version = classifier.version
             if is_toxic:
                 comment.status = 'pending_review'; comment.toxicity_label = label; comment.save()
                 messages.warning(request, f"Your comment was flagged as '{label}' and is now pending review.")
@@ -146,6 +188,23 @@ def report_comment(request, pk):
     comment = get_object_or_404(Comment, pk=pk); comment.status = 'reported'; comment.save()
     messages.success(request, 'Thank you for your report. An admin will review this comment.')
     return redirect('post_detail', pk=comment.post.pk)
+
+DASHBOARD_PAGE_SIZE = 10
+DASHBOARD_TABS = {
+    'action': 'blog/includes/dashboard_action_required._comments.html',
+    'posts': 'blog/includes/dashboard_my_posts.html',
+    'comments': 'blog/includes/dashboard_comment_history.html',
+}
+
+def _is_author(user):
+    return user.is_superuser or user.groups.filter(name='Authors').exists()
+
+def _dashboard_tab_queryset(user, tab):
+    if tab == 'posts':
+        return Post.objects.filter(author=user)
+    comments = Comment.objects.filter(author=user).select_related('post')
+    return comments.filter(status='pending_review') if tab == 'action' else comments
+
 @login_required
 def dashboard(request):
     user = request.user
@@ -165,35 +224,59 @@ def dashboard(request):
         u_form = UserUpdateForm(instance=user, user=user)
         p_form = ProfileUpdateForm(instance=user.profile)
 
-    all_comments = Comment.objects.filter(author=user).order_by('-created_at')
-    notifications = Notification.objects.filter(user=user).order_by('-created_at')
-    notifications.filter(read=False).update(read=True)
+    mark_notifications_read(user)
 
-    is_author = user.groups.filter(name='Authors').exists() or user.is_superuser
-    user_posts = Post.objects.filter(author=user) if is_author else []
+    is_author = _is_author(user)
+
+    # Only the (bounded) first page of "Action Required" is loaded here; it
+    # decides which tab opens first. The other tabs fetch their pages from
+    # dashboard_tab when they are shown.
+    action_required = paginate_by_cursor(_dashboard_tab_queryset(user, 'action'), None, DASHBOARD_PAGE_SIZE)
 
     context = {
-        'all_comments': all_comments,
-        'action_required_comments': all_comments.filter(status='pending_review'),
-        'notifications': notifications,
+        'action_required_comments': action_required,
         'is_author': is_author,
         'u_form': u_form,
         'p_form': p_form,
-        'user_posts': user_posts,
-        'author_stats': {},
-        'existing_usernames': list(User.objects.exclude(pk=user.pk).values_list('username', flat=True)),  # 👈 HERE
+        # One primary-key lookup, kept up to date by blog/counters.py.
+        'author_stats': AuthorStats.objects.filter(author=user).first() if is_author else None,
     }
 
-    if is_author and user_posts.exists():
-        first_post = user_posts.order_by('created_at').first()
-        context['author_stats'] = {
-            'total_posts': user_posts.count(),
-            'total_comments_received': Comment.objects.filter(post__in=user_posts).count(),
-            'time_as_author': timezone.now() - first_post.created_at if first_post else None,
-        }
-
     return render(request, 'blog/dashboard.html', context)
 
+@login_required
+def dashboard_tab(request, tab):
+    """One cursor page of a dashboard tab, as an HTML fragment for the dashboard's JS."""
+    if tab not in DASHBOARD_TABS or (tab == 'posts' and not _is_author(request.user)):
+        raise Http404
+    page_obj = paginate_by_cursor(
+        _dashboard_tab_queryset(request.user, tab), request.GET.get(CURSOR_PARAM), DASHBOARD_PAGE_SIZE
+    )
+    return render(request, 'blog/includes/dashboard_tab.html', {
+        'tab': tab, 'tab_template': DASHBOARD_TABS[tab], 'page_obj': page_obj,
+    })
+
+@login_required
+def check_availability(request):
+    """
+    JSON for the dashboard's live checks: is ?username= or ?email= free for
+    the current user to take? One indexed lookup, rate-limited per user.
+    """
+    field = 'username' if 'username' in request.GET else 'email' if 'email' in request.GET else None
+    if field is None:
+        return JsonResponse({'error': 'Pass a username or an email.'}, status=400)
+    if not allow_availability_check(request.user):
+        return JsonResponse({'error': 'Too many checks, please slow down.'}, status=429)
+
+    value = request.GET[field].strip()
+    taken = username_taken if field == 'username' else email_taken
+    available = bool(value) and not taken(value, exclude_pk=request.user.pk)
+    return JsonResponse({
+        'field': field,
+        'available': available,
+        'message': '' if available or not value else f'This {field} is already taken.',
+    })
+
 @login_required
 def admin_dashboard(request):
     # This permission check is crucial
@@ -201,44 +284,99 @@ def admin_dashboard(request):
         messages.error(request, "You do not have permission to view this page.")
         return redirect('post_list')
     
-    # Define the statuses that require a moderator's attention
-    moderation_statuses = Q(status='pending_review') | Q(status='reported')
-
-    # Gather all the statistics and recent items for the dashboard
+    # Totals and trends are materialized (blog/site_stats.py): no COUNT(*) over whole tables.
     context = {
-        'stats': {
-            'total_posts': Post.objects.count(),
-            'total_comments': Comment.objects.count(),
-            'total_users': User.objects.count(),
-            'comments_to_moderate_count': Comment.objects.filter(moderation_statuses).count(),
-        },
-        'moderation_queue': Comment.objects.filter(moderation_statuses).order_by('-created_at')[:5],
+        'stats': get_site_stats(),
+        'trends': hourly_trends(),
+        'moderation_queue': newest(
+            [Comment.objects.filter(status=status).select_related('author') for status in Comment.MODERATION_STATUSES], 5
+        ),
         'recent_posts': Post.objects.order_by('-created_at')[:5],
-        'recent_approved_comments': Comment.objects.filter(status='approved').order_by('-created_at')[:5],
+        'recent_approved_comments': Comment.objects.filter(status='approved').select_related('author').order_by('-created_at')[:5],
     }
     return render(request, 'blog/admin_dashboard.html', context)
 @login_required
+def classifier_metrics_view(request):
+    if not request.user.is_superuser:
+        messages.error(request, "You do not have permission to view this page.")
+        return redirect('post_list')
+
+    classifier = get_toxicity_classifier()
+    context = {
+        'metrics': classifier_metrics.snapshot(),
+        'cache_stats': classifier.cache.stats() if classifier.cache is not None else None,
+        'model_version': classifier.version,
+        'load_timings': load_timings,
+    }
+    return render(request, 'blog/classifier_metrics.html', context)
+
+def classifier_metrics_prometheus(request):
+    # Scrapers authenticate with `Authorization: Bearer <TOXICITY_METRICS_TOKEN>`.
+    token = settings.TOXICITY_METRICS_TOKEN
+    has_token = bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not (has_token or request.user.is_superuser):
+        return HttpResponseForbidden()
+
+    classifier = get_toxicity_classifier()
+    body = classifier_metrics.prometheus(
+        model_version=classifier.version,
+        cache_stats=classifier.cache.stats() if classifier.cache is not None else None,
+    )
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@login_required
 def admin_comments(request):
     if not request.user.is_superuser: messages.error(request, "You do not have permission to access this page."); return redirect('post_list')
-    comments_to_moderate = Comment.objects.filter(Q(status='pending_review') | Q(status='reported')).order_by('-created_at')
-    paginator = Paginator(comments_to_moderate, 10); page_obj = paginator.get_page(request.GET.get('page'))
-    return render(request, 'blog/admin_comments.html', {'comments': page_obj})
+    # One queryset per status, so each page is a merge of (status, created_at) index range scans.
+    comments_to_moderate = [
+        Comment.objects.filter(status=status).select_related('post', 'author') for status in Comment.MODERATION_STATUSES
+    ]
+    page_obj = paginate_by_cursor(comments_to_moderate, request.GET.get(CURSOR_PARAM), 10)
+    return render(request, 'blog/admin_comments.html', {'comments': page_obj, 'page_obj': page_obj})
 
 @login_required
 def approve_comment(request, pk):
     if not request.user.is_superuser: return redirect('post_list')
-    comment = get_object_or_404(Comment, pk=pk); comment.status = 'approved'; comment.save()
-    Notification.objects.create(user=comment.author, message=f"Your comment on '{comment.post.title}' has been approved by an admin.", comment=comment)
+    comment = get_object_or_404(Comment, pk=pk); approve_comments(Comment.objects.filter(pk=comment.pk))
     messages.success(request, 'Comment approved successfully.')
     return redirect('admin_comments')
 
 @login_required
 def delete_comment(request, pk):
     if not request.user.is_superuser: return redirect('post_list')
-    comment = get_object_or_404(Comment, pk=pk); comment.delete()
+    comment = get_object_or_404(Comment, pk=pk); delete_comments(Comment.objects.filter(pk=comment.pk))
     messages.success(request, 'Comment deleted successfully.')
     return redirect('admin_comments')
 
+BULK_MODERATION_ACTIONS = {
+    'approve': (approve_comments, 'approved'),
+    'reject': (reject_comments, 'rejected'),
+    'delete': (delete_comments, 'deleted'),
+}
+
+@login_required
+@require_POST
+def bulk_moderate_comments(request):
+    """Applies one moderation action to the ticked comments, or to the whole queue."""
+    if not request.user.is_superuser: return redirect('post_list')
+    action = BULK_MODERATION_ACTIONS.get(request.POST.get('action'))
+    if action is None:
+        messages.error(request, 'Unknown moderation action.')
+        return redirect('admin_comments')
+
+    queue = Comment.objects.filter(status__in=Comment.MODERATION_STATUSES)
+    if request.POST.get('scope') != 'all':
+        ids = [pk for pk in request.POST.getlist('comment_ids') if pk.isdigit()]
+        if not ids:
+            messages.error(request, 'Select at least one comment.')
+            return redirect('admin_comments')
+        queue = queue.filter(pk__in=ids)
+
+    apply, verb = action
+    count = apply(queue)
+    messages.success(request, f'{count} comment(s) {verb}.')
+    return redirect('admin_comments')
+
 @login_required
 def edit_my_comment(request, pk):
     comment = get_object_or_404(Comment, pk=pk, author=request.user)
@@ -246,12 +384,16 @@ def edit_my_comment(request, pk):
         form = CommentForm(request.POST, instance=comment)
         if form.is_valid():
             edited_comment = form.save(commit=False)
-            is_toxic, label = toxicity_classifier.predict(edited_comment.text)
+            classifier = get_toxicity_classifier()
+            is_toxic, label = classifier.predict(edited_comment.text); edited_comment.model_version = classifier.version
             if is_toxic:
                 edited_comment.status = 'pending_review'; edited_comment.toxicity_label = label
                 messages.warning(request, f"Your edited comment was still flagged as '{label}' and requires review.")
             else:
-                edited_comment.status = 'approved'; messages.success(request, "Your comment has been updated and approved!")
+                # Clear the label from an earlier flag: an approved comment with a
+                # label is one a moderator approved (see moderation.rescore_target).
+                edited_comment.status = 'approved'; edited_comment.toxicity_label = None
+                messages.success(request, "Your comment has been updated and approved!")
             edited_comment.is_edited = True; edited_comment.save()
             return redirect('dashboard')
     else:
@@ -46,6 +46,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack; inert unless
+    # REQUEST_PROFILER_SAMPLE_RATE > 0.
+    "blog.middleware.RequestProfilerMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -86,6 +89,16 @@ LOGGING = {
             "class": "logging.FileHandler",
             "filename": "debug.log", # The file to save logs to
         },
+        "profiler": {
+            "level": "INFO", # Sampled request profiles (off unless REQUEST_PROFILER_SAMPLE_RATE > 0)
+            "class": "logging.FileHandler",
+            "filename": "debug.log",
+        },
+        "classifier": {
+            "level": "INFO", # Toxicity model load, warm-up and hot-reload timings
+            "class": "logging.FileHandler",
+            "filename": "debug.log",
+        },
     },
     "loggers": {
         "django": {
@@ -93,8 +106,73 @@ LOGGING = {
             "level": "ERROR",
             "propagate": True,
         },
+        "blog": {
+            "handlers": ["file"],
+            "level": "ERROR",
+            "propagate": False,
+        },
+        "blog.profiler": {
+            "handlers": ["profiler"],
+            "level": "INFO",
+            "propagate": False,
+        },
+        "blog.classifier": {
+            "handlers": ["classifier"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
 }
+
+# Preload the toxicity model in BlogConfig.ready(). Enable this for web workers
+# only (e.g. `TOXICITY_PRELOAD=1 gunicorn --preload ...`) so the model is loaded
+# once in the master and shared copy-on-write with the forked workers.
+TOXICITY_PRELOAD = os.environ.get('TOXICITY_PRELOAD') == '1'
+
+# How often (seconds) each process checks the model manifest for a newly
+# published version to hot-reload. 0 disables reloading.
+TOXICITY_RELOAD_INTERVAL = 30
+
+# Number of recent verdicts the classifier keeps per process (0 disables the cache).
+TOXICITY_CACHE_SIZE = 4096
+
+# Record latency/decision metrics for every prediction (see blog/classifier_metrics.py).
+TOXICITY_METRICS_ENABLED = True
+
+# Optional bearer token that lets a Prometheus scraper read
+# /admin/classifier-metrics/prometheus/ without a superuser session.
+TOXICITY_METRICS_TOKEN = os.environ.get('TOXICITY_METRICS_TOKEN', '')
+
+# Share of requests profiled by blog.middleware.RequestProfilerMiddleware
+# (0.0 = off, 1.0 = every request). Sampled requests get a Server-Timing
+# header and a JSON line on the 'blog.profiler' logger (debug.log).
+REQUEST_PROFILER_SAMPLE_RATE = float(os.environ.get('REQUEST_PROFILER_SAMPLE_RATE', '0'))
+
+# Number of slowest SQL statements included in each profile line.
+REQUEST_PROFILER_SLOW_QUERIES = 3
+
+# Save new comments as 'pending_classification' and classify them out of the
+# request with `manage.py moderate_comments` instead of inside add_comment.
+TOXICITY_ASYNC_MODERATION = os.environ.get('TOXICITY_ASYNC_MODERATION') == '1'
+
+# A file-based cache is shared by every worker process on the host (so signal
+# invalidation reaches all of them) without needing memcached or redis.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("DJANGO_CACHE_DIR", BASE_DIR / ".cache"),
+    }
+}
+
+# Upper bound (seconds) on how stale the homepage sidebar can get if a change
+# bypasses the invalidation signals.
+SIDEBAR_CACHE_TIMEOUT = 300
+
+# Live username/email availability checks each user may make per minute
+# from the dashboard before getting HTTP 429. Approximate with the file cache
+# above, whose incr() isn't atomic (see blog/accounts.py).
+AVAILABILITY_CHECKS_PER_MINUTE = 30
+
 WSGI_APPLICATION = "toxicity_blog.wsgi.application"
 
 
@@ -105,6 +183,11 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Transactions take the write lock when they begin, and wait up to
+        # `timeout` seconds for it, instead of failing with "database is
+        # locked" when a read inside them is later upgraded to a write
+        # (e.g. two moderate_comments workers applying batches at once).
+        "OPTIONS": {"transaction_mode": "IMMEDIATE", "timeout": 20},
     }
 }
 